@@ -0,0 +1,394 @@
+#/usr/bin/env python3
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from ipaddress import IPv6Address
+import NMtcpdump
+from NMsim import SimulatedSnmpAgent, FakeIosServer, SIM_SNMP_PORT, SIM_OIDS
+
+# benchmarks for the NM modules
+# snmp and ssh code runs against the local stand-ins of NMsim instead of the lab routers,
+# so runs are reproducible and can be saved and compared, e.g.
+#   python3 NMbench.py --save before.json
+#   python3 NMbench.py --compare before.json
+
+PCAP_SIZES = (1000, 10000, 100000)
+SNMP_ROWS = (10, 100, 1000)
+SNMP_ROUTERS = 10
+SNMP_LATENCY = 0.005
+SNMP_REPEAT = 3
+CPU_TICKS = 5
+DHCP_CLIENTS = (2, 50)
+SSH_LATENCY = 0.002
+BENCHMARKS = ("imports", "pcap", "snmp", "cpu", "dhcp")
+
+# fields that identify a result when two runs are compared, and the metric compared
+PARAM_FIELDS = ("packets", "rows", "routers", "clients", "latency_ms")
+METRIC_FIELDS = ("seconds", "import_ms")
+REGRESSION_THRESHOLD = 0.10
+
+# write a classic pcap with a mix of matching ipv6, foreign ipv6 and ipv4 frames
+def generate_pcap(path, packets, sources=16, seed=1):
+    rng = random.Random(seed)
+    prefix = NMtcpdump.prefix_bytes(NMtcpdump.IPV6_PREFIX)
+
+    # eui-64 addresses built from random macs, as a real lan would have
+    hosts = []
+    for _ in range(sources):
+        mac = bytes([rng.randrange(256) & 0xFC]) + rng.randbytes(5)
+        iid = bytes([mac[0] ^ 0x02]) + mac[1:3] + b"\xff\xfe" + mac[3:]
+        hosts.append((mac, prefix + iid))
+    foreign = IPv6Address("2001:db8::1").packed
+
+    with open(path, "wb") as f:
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, NMtcpdump.LINKTYPE_ETHERNET))
+        for i in range(packets):
+            kind = i % 4
+            mac, src = hosts[i % sources]
+            if kind == 3:  # ipv4 frame
+                frame = b"\xff" * 6 + mac + b"\x08\x00" + b"\x45" + bytes(59)
+            else:
+                src = foreign if kind == 2 else src
+                ipv6 = b"\x60\x00\x00\x00\x00\x20\x3a\x40" + src + foreign + bytes(32)
+                frame = b"\x33\x33\x00\x00\x00\x01" + mac + NMtcpdump.ETHERTYPE_IPV6 + ipv6
+            f.write(struct.pack("<IIII", 1700000000 + i // 1000, i % 1000 * 1000, len(frame), len(frame)))
+            f.write(frame)
+
+# time each extractor on captures of increasing size
+def bench_pcap_extract(sizes=PCAP_SIZES, rdpcap_limit=100000):
+    extractors = {
+        "rdpcap": NMtcpdump.extract_mac_ipv6,
+        "stream": NMtcpdump.extract_mac_ipv6_stream,
+        "mmap": NMtcpdump.extract_mac_ipv6_fast,
+    }
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            path = os.path.join(tmp, f"bench_{size}.pcap")
+            generate_pcap(path, size)
+            expected = None
+            for name, extract in extractors.items():
+                if name == "rdpcap" and size > rdpcap_limit:
+                    continue  # loads everything into memory
+                start = time.perf_counter()
+                mapping = extract(path)
+                elapsed = time.perf_counter() - start
+                if expected is None:
+                    expected = mapping
+                elif mapping != expected:
+                    raise AssertionError(f"{name} output differs on {size} packets")
+                results.append({
+                    "benchmark": f"pcap_extract_{name}",
+                    "packets": size,
+                    "seconds": round(elapsed, 4),
+                    "packets_per_second": round(size / elapsed) if elapsed else None,
+                })
+    return results
+
+# import cost of every NMmain stage, each measured in a fresh interpreter
+# import_ms is what python -X importtime reports for the stage modules, total_ms the
+# wall time of the interpreter including its own startup
+def bench_imports(stages=None, repeat=3):
+    import NMmain
+
+    stages = stages or list(NMmain.STAGE_MODULES)
+    results = []
+    for stage in ["NMmain"] + stages:
+        modules = ("NMmain",) if stage == "NMmain" else NMmain.STAGE_MODULES[stage]
+        code = "; ".join(f"import {module}" for module in modules)
+        import_us, totals = [], []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                                  capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+            totals.append(time.perf_counter() - start)
+            if proc.returncode:
+                raise RuntimeError(f"importing {stage} failed: {proc.stderr.strip().splitlines()[-1]}")
+            # cumulative column of the top-level stage modules
+            cumulative = 0
+            for line in proc.stderr.splitlines():
+                parts = [p.strip() for p in line.split("|")]
+                if len(parts) == 3 and parts[2] in modules:
+                    cumulative += int(parts[1])
+            import_us.append(cumulative)
+        results.append({
+            "benchmark": f"import_{stage}",
+            "import_ms": round(min(import_us) / 1000, 1),
+            "total_ms": round(min(totals) * 1000, 1),
+        })
+    return results
+
+# stand-in helpers
+@contextlib.contextmanager
+def quiet():
+    # the NM functions report progress with print, keep it out of the timings output
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+# loopback addresses for simulated routers, linux answers on all of 127.0.0.0/8
+def sim_hosts(count):
+    return [f"127.0.{i // 250}.{i % 250 + 2}" for i in range(count)]
+
+def module_available(name):
+    try:
+        __import__(name)
+        return True
+    except ImportError:
+        return False
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def check_snmp_data(snmp_data, rows, name):
+    for router, data in snmp_data.items():
+        if len(data["interface_status"]) != rows or len(data["ipv6_addresses"]) != rows:
+            raise AssertionError(f"{name} returned incomplete data for {router} with {rows} rows")
+
+# fetch_snmp_data (serial), fetch_snmp_data_concurrent and fetch_snmp_data_async
+# against one simulated agent per row count, every router answering after latency seconds
+# the easysnmp based fetchers are skipped when easysnmp is not installed
+# best of repeat runs is reported
+def bench_snmp_fetch(rows=SNMP_ROWS, routers=SNMP_ROUTERS, latency=SNMP_LATENCY, port=SIM_SNMP_PORT,
+                     repeat=SNMP_REPEAT):
+    import NMsnmp
+    import NMsnmpasync
+
+    hosts = sim_hosts(routers)
+    router_ips = {f"R{i + 1}": host for i, host in enumerate(hosts)}
+    # net-snmp takes the agent port as part of the peer name
+    easysnmp_ips = {router: f"{host}:{port}" for router, host in router_ips.items()}
+    runs = {"async": lambda: asyncio.run(NMsnmpasync.fetch_snmp_data_async(router_ips, SIM_OIDS, port=port))[0]}
+    if module_available("easysnmp"):
+        runs["serial"] = lambda: NMsnmp.fetch_snmp_data(easysnmp_ips, SIM_OIDS)
+        runs["threads"] = lambda: NMsnmp.fetch_snmp_data_concurrent(easysnmp_ips, SIM_OIDS)
+
+    results = []
+    for row_count in rows:
+        with SimulatedSnmpAgent(hosts, port, rows=row_count, latency=latency) as agent:
+            for name, run in runs.items():
+                times = []
+                for _ in range(repeat):
+                    NMsnmp.SESSION_POOL.clear()
+                    requests = agent.requests
+                    with quiet():
+                        snmp_data, elapsed = timed(run)
+                    check_snmp_data(snmp_data, row_count, name)
+                    times.append(elapsed)
+                elapsed = min(times)
+                results.append({
+                    "benchmark": f"snmp_fetch_{name}",
+                    "rows": row_count,
+                    "routers": routers,
+                    "latency_ms": latency * 1000,
+                    "seconds": round(elapsed, 4),
+                    "routers_per_second": round(routers / elapsed, 1),
+                    "requests": agent.requests - requests,
+                })
+    if "serial" not in runs:
+        results.append({"benchmark": "snmp_fetch_easysnmp", "skipped": "easysnmp not installed"})
+    return results
+
+# cpu sampling: time per tick across all routers for monitor_cpu_async and CpuMonitor,
+# and a full monitor_cpu run of one router including the chart
+def bench_cpu_monitor(routers=SNMP_ROUTERS, ticks=CPU_TICKS, latency=SNMP_LATENCY, port=SIM_SNMP_PORT):
+    import NMsnmp
+    import NMsnmpasync
+
+    hosts = sim_hosts(routers)
+    router_ips = {f"R{i + 1}": host for i, host in enumerate(hosts)}
+    oid = SIM_OIDS["OID_CPU_UTILIZATION"]
+    results = []
+
+    def tick_result(name, elapsed, count=routers):
+        return {
+            "benchmark": name,
+            "routers": count,
+            "latency_ms": latency * 1000,
+            "seconds": round(elapsed, 4),
+            "tick_ms": round(elapsed / ticks * 1000, 2),
+        }
+
+    with SimulatedSnmpAgent(hosts, port, latency=latency) as agent:
+        # an interval shorter than a tick runs the ticks back to back
+        interval = 0.001
+        with quiet():
+            (samples, missed), elapsed = timed(asyncio.run, NMsnmpasync.monitor_cpu_async(
+                router_ips, oid, duration=ticks * interval, interval=interval, deadline=1, port=port))
+        if any(missed.values()):
+            raise AssertionError(f"monitor_cpu_async missed samples: {missed}")
+        results.append(tick_result("cpu_monitor_async", elapsed))
+
+        # a router that first answers mid-run gets its history row on the fly
+        from NMcpumon import CpuHistory, CpuMonitor
+        history = CpuHistory(list(router_ips)[:-1], capacity=ticks)
+        for tick in range(ticks):
+            history.record(tick, {router: cpu for router, (_, cpu) in
+                                  zip(router_ips, (points[tick] for points in samples.values()))})
+        late = list(router_ips)[-1]
+        if history.stats()[late]["samples"] != ticks:
+            raise AssertionError(f"CpuHistory lost samples of {late}, which joined after the start")
+
+        if not module_available("easysnmp"):
+            results.append({"benchmark": "cpu_monitor_easysnmp", "skipped": "easysnmp not installed"})
+            return results
+
+
+        easysnmp_ips = {router: f"{host}:{port}" for router, host in router_ips.items()}
+        monitor = CpuMonitor(easysnmp_ips, oid, interval=interval)
+        with ThreadPoolExecutor(max_workers=monitor.max_workers) as executor:
+            start = time.perf_counter()
+            for tick in range(ticks):
+                monitor.sample_once(executor, tick)
+            results.append(tick_result("cpu_monitor_threads", time.perf_counter() - start))
+
+        # monitor_cpu writes cpu_utilization.jpg into the working directory
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp, quiet():
+            os.chdir(tmp)
+            try:
+                _, elapsed = timed(NMsnmp.monitor_cpu, easysnmp_ips["R1"], oid,
+                                   duration=ticks * latency, interval=0)
+            finally:
+                os.chdir(cwd)
+        results.append(dict(tick_result("monitor_cpu", elapsed, 1), requests=agent.requests))
+    return results
+
+# the dhcp steps of NMmain against two fake ios routers: R4 answers show ipv6 neighbors,
+# R5 takes the dhcp config and reports bindings for it
+def bench_dhcp(clients=DHCP_CLIENTS, latency=SSH_LATENCY):
+    if not module_available("paramiko"):
+        return [{"benchmark": "dhcp", "skipped": "paramiko not installed"}]
+
+    import NMdhcpserver
+    from NMdhcpprov import build_reservations
+    from NMiosparse import SHOW_CACHE
+    from NMsshpool import SSH_POOL
+
+    r5_ipv6 = "2001:1111:2222:3333:C805:17FF:FE5F:0"
+    results = []
+    with FakeIosServer(hostname="R4", neighbors=[(r5_ipv6, "ca05.17ff.0000")], latency=latency) as r4:
+        r4_creds = r4.credentials()
+        for count in clients:
+            macs = [f"CA:{i >> 8:02X}:{i & 0xFF:02X}:89:00:00" for i in range(count)]
+            with FakeIosServer(hostname="R5", latency=latency) as r5:
+                r5_creds = r5.credentials()
+                SSH_POOL.close_all()
+                SHOW_CACHE.invalidate()
+                steps = [
+                    ("ssh_connect", NMdhcpserver.test_ssh_connection, (r5_creds,)),
+                    ("get_r5_ipv6_address", NMdhcpserver.get_r5_ipv6_address, (r4_creds,)),
+                    ("configure_full", NMdhcpserver.configure_dhcp_on_r5, (r5_creds, macs)),
+                    ("configure_noop", NMdhcpserver.configure_dhcp_on_r5, (r5_creds, macs)),
+                    ("get_dhcp_clients", NMdhcpserver.get_dhcp_clients, (r5_creds, macs, 10)),
+                ]
+                for name, func, args in steps:
+                    commands = r4.commands + r5.commands
+                    with quiet():
+                        result, elapsed = timed(func, *args)
+                    if not result:
+                        raise AssertionError(f"{name} failed against the fake routers")
+                    results.append({
+                        "benchmark": f"dhcp_{name}",
+                        "clients": count,
+                        "latency_ms": latency * 1000,
+                        "seconds": round(elapsed, 4),
+                        "commands": r4.commands + r5.commands - commands,
+                    })
+                if len(build_reservations(macs)) != len(r5.show_dhcp_binding().splitlines()) - 4:
+                    raise AssertionError(f"fake R5 did not bind all {count} clients")
+        SSH_POOL.close_all()
+    return results
+
+def print_results(results):
+    for result in results:
+        details = ", ".join(f"{k}: {v}" for k, v in result.items() if k != "benchmark")
+        print(f"{result['benchmark']:<28} {details}")
+
+
+# saving and comparing runs
+def save_results(results, filename):
+    run = {
+        "created": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    with open(filename, "w", encoding="utf8") as file:
+        json.dump(run, file, indent=4)
+    print(f"benchmark results saved to {filename}")
+
+def load_results(filename):
+    with open(filename, "r", encoding="utf8") as file:
+        return json.load(file)["results"]
+
+def result_key(result):
+    return (result["benchmark"],) + tuple((field, result[field]) for field in PARAM_FIELDS if field in result)
+
+def result_metric(result):
+    return next(((field, result[field]) for field in METRIC_FIELDS if field in result), (None, None))
+
+#print every result next to its baseline, returns the results that got slower than threshold
+def compare_results(baseline, results, threshold=REGRESSION_THRESHOLD):
+    before = {result_key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        field, value = result_metric(result)
+        old = before.get(result_key(result))
+        params = ", ".join(f"{k}: {v}" for k, v in result_key(result)[1:])
+        if field is None or old is None or not old.get(field):
+            print(f"{result['benchmark']:<28} {params:<40} no baseline")
+            continue
+        ratio = value / old[field]
+        status = "slower" if ratio > 1 + threshold else "faster" if ratio < 1 - threshold else "same"
+        print(f"{result['benchmark']:<28} {params:<40} {old[field]:>10} -> {value:<10} x{ratio:.2f} {status}")
+        if status == "slower":
+            regressions.append(result)
+    return regressions
+
+def run_benchmarks(names=BENCHMARKS, quick=False):
+    runners = {
+        "imports": lambda: bench_imports(repeat=1 if quick else 3),
+        "pcap": lambda: bench_pcap_extract(PCAP_SIZES[:2] if quick else PCAP_SIZES),
+        "snmp": lambda: bench_snmp_fetch(SNMP_ROWS[:2] if quick else SNMP_ROWS),
+        "cpu": lambda: bench_cpu_monitor(),
+        "dhcp": lambda: bench_dhcp(DHCP_CLIENTS[:1] if quick else DHCP_CLIENTS),
+    }
+    results = []
+    for name in names:
+        results.extend(runners[name]())
+    return results
+
+
+#MAIN
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks for the NM modules against local stand-ins")
+    parser.add_argument("benchmarks", nargs="*", help=f"benchmarks to run: {', '.join(BENCHMARKS)} (all by default)")
+    parser.add_argument("--quick", action="store_true", help="smaller sizes for a fast check")
+    parser.add_argument("--save", metavar="FILE", help="write the results as json")
+    parser.add_argument("--compare", metavar="FILE", help="compare with results saved earlier")
+    args = parser.parse_args()
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s) {', '.join(unknown)}")
+
+    results = run_benchmarks(args.benchmarks or BENCHMARKS, args.quick)
+    print_results(results)
+    if args.save:
+        save_results(results, args.save)
+    if args.compare:
+        print(f"\ncompared with {args.compare}:")
+        if compare_results(load_results(args.compare), results):
+            sys.exit(1)
@@ -0,0 +1,134 @@
+#/usr/bin/env python3
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# cpu chart rendering
+# charts are drawn with matplotlib's object-oriented api on an Agg canvas, never through
+# pyplot, so no figure stays registered after it is saved. long series are thinned with
+# LTTB before plotting, and charts of many routers are rendered across a process pool
+# where every worker reuses one figure
+
+# points kept per series, about one per horizontal pixel of the default chart
+CHART_MAX_POINTS = 800
+# series longer than this are drawn without point markers
+CHART_MARKER_LIMIT = 120
+CHART_SIZE = (8, 4)
+CHART_DPI = 100
+CHART_FILE_PATTERN = "cpu_utilization_{router}.jpg"
+SMALL_MULTIPLES_FILE = "cpu_utilization_all.jpg"
+
+_worker_figure = None  # figure reused by every chart a pool worker renders
+
+
+#largest-triangle-three-buckets downsampling to at most threshold points
+#keeps the first and last point and, per bucket, the point that spans the largest triangle
+#with the previous pick and the average of the next bucket. NaN samples are dropped
+def lttb(x, y, threshold=CHART_MAX_POINTS):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    valid = ~(np.isnan(x) | np.isnan(y))
+    x, y = x[valid], y[valid]
+    n = len(x)
+    if threshold < 3 or n <= threshold:
+        return x, y
+
+    every = (n - 2) / (threshold - 2)
+    picks = np.empty(threshold, dtype=np.int64)
+    picks[0], picks[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x = x[end:next_end].mean() if next_end > end else x[-1]
+        avg_y = y[end:next_end].mean() if next_end > end else y[-1]
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        picks[i + 1] = a
+    return x[picks], y[picks]
+
+#{router: [(elapsed, cpu)]} from monitor_cpu_async into {router: (timestamps, values)}
+def series_from_samples(samples):
+    return {router: ([t for t, _ in points], [cpu for _, cpu in points]) for router, points in samples.items()}
+
+#{router: (timestamps, values)} from a CpuMonitor/CpuHistory snapshot, missing samples become NaN
+def series_from_snapshot(snapshot):
+    timestamps = snapshot["timestamps"]
+    start = timestamps[0] if timestamps else 0
+    elapsed = [t - start for t in timestamps]
+    return {router: (elapsed, [np.nan if v is None else v for v in values])
+            for router, values in snapshot["routers"].items()}
+
+def chart_path(router, output_dir=".", pattern=CHART_FILE_PATTERN):
+    return os.path.join(output_dir, pattern.format(router=re.sub(r"[^\w.-]", "_", str(router))))
+
+
+def new_figure(figsize=CHART_SIZE, dpi=CHART_DPI):
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    figure = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(figure)
+    return figure
+
+def plot_cpu(ax, timestamps, values, title, max_points=CHART_MAX_POINTS):
+    x, y = lttb(timestamps, values, max_points)
+    ax.plot(x, y, marker="o" if len(x) <= CHART_MARKER_LIMIT else None, linestyle="-", color="b")
+    ax.set_xlabel("Time (seconds)")
+    ax.set_ylabel("CPU Utilization (%)")
+    ax.set_title(title)
+    ax.grid()
+
+#draw one cpu chart and save it to path, figure is cleared and reused when given
+def render_cpu_chart(timestamps, values, path, title="CPU Utilization Over Time",
+                     max_points=CHART_MAX_POINTS, figure=None):
+    figure = figure if figure is not None else new_figure()
+    figure.clear()
+    plot_cpu(figure.add_subplot(), timestamps, values, title, max_points)
+    figure.savefig(path)
+    return path
+
+def _render_job(job):
+    # pool worker, one figure per process for all the charts it draws
+    global _worker_figure
+    if _worker_figure is None:
+        _worker_figure = new_figure()
+    return render_cpu_chart(*job, figure=_worker_figure)
+
+#one chart per router, rendered in parallel across processes
+#series is {router: (timestamps, values)}, returns {router: path}
+def render_cpu_charts(series, output_dir=".", max_workers=None, max_points=CHART_MAX_POINTS,
+                      pattern=CHART_FILE_PATTERN):
+    jobs = [
+        (timestamps, values, chart_path(router, output_dir, pattern),
+         f"CPU Utilization of {router} Over Time", max_points)
+        for router, (timestamps, values) in series.items()
+    ]
+    if len(jobs) <= 1 or max_workers == 1:
+        figure = new_figure()
+        paths = [render_cpu_chart(*job, figure=figure) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            paths = list(executor.map(_render_job, jobs))
+    return dict(zip(series, paths))
+
+#every router as a small chart in one image, sharing the y axis
+def render_small_multiples(series, path=SMALL_MULTIPLES_FILE, columns=3, max_points=CHART_MAX_POINTS,
+                           panel_size=(4, 2.5)):
+    rows = max(1, -(-len(series) // columns))
+    columns = max(1, min(columns, len(series)))
+    figure = new_figure(figsize=(panel_size[0] * columns, panel_size[1] * rows))
+    axes = figure.subplots(rows, columns, sharex=True, sharey=True, squeeze=False).ravel()
+    for ax, (router, (timestamps, values)) in zip(axes, series.items()):
+        plot_cpu(ax, timestamps, values, str(router), max_points)
+        ax.set_xlabel("")
+        ax.set_ylabel("")
+    for ax in axes[len(series):]:
+        ax.set_visible(False)
+    figure.supxlabel("Time (seconds)")
+    figure.supylabel("CPU Utilization (%)")
+    figure.tight_layout()
+    figure.savefig(path)
+    return path
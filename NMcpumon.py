@@ -0,0 +1,191 @@
+#/usr/bin/env python3
+import json
+import os
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from NMsnmp import SNMP_MAX_WORKERS, load_router_ips, load_oids, snmp_walk
+
+# fleet cpu monitor
+# every router gets a fixed-size row in one numpy ring buffer, all routers share the
+# tick timestamps, so memory stays constant and stats are computed for the whole fleet at once
+
+# samples kept per router (360 x 10s = 1 hour) and default percentiles
+CPU_HISTORY_CAPACITY = 360
+CPU_PERCENTILES = (50, 95)
+
+
+class CpuHistory:
+    """Ring buffer of cpu samples, one row per router and one column per tick.
+    Missing samples are stored as NaN."""
+
+    def __init__(self, routers, capacity=CPU_HISTORY_CAPACITY):
+        self.capacity = capacity
+        self.rows = {router: i for i, router in enumerate(routers)}
+        self.values = np.full((len(self.rows), capacity), np.nan)
+        self.timestamps = np.full(capacity, np.nan)
+        self.count = 0  # ticks recorded so far, the next tick goes to count % capacity
+
+    def add_router(self, router):
+        if router not in self.rows:
+            self.rows[router] = len(self.rows)
+            self.values = np.vstack([self.values, np.full((1, self.capacity), np.nan)])
+        return self.rows[router]
+
+    def record(self, timestamp, samples):
+        """Store one tick, samples is {router: cpu or None}."""
+        slot = self.count % self.capacity
+        self.timestamps[slot] = timestamp
+        self.values[:, slot] = np.nan
+        for router, cpu in samples.items():
+            if cpu is not None:
+                # add_router can replace self.values, so take the row before indexing it
+                row = self.add_router(router)
+                self.values[row, slot] = cpu
+        self.count += 1
+
+    def _order(self, window=None):
+        # column indexes of the last window ticks, oldest first
+        size = min(self.count, self.capacity)
+        if window:
+            size = min(size, window)
+        return np.arange(self.count - size, self.count) % self.capacity
+
+    def stats(self, window=None, percentiles=CPU_PERCENTILES):
+        """Rolling min/avg/max/percentiles per router over the last window ticks."""
+        order = self._order(window)
+        values = self.values[:, order]
+        if not order.size:
+            return {}
+
+        samples = (~np.isnan(values)).sum(axis=1)
+        # routers without samples are all-NaN rows, numpy warns about those and returns NaN
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            minimum = np.nanmin(values, axis=1)
+            average = np.nanmean(values, axis=1)
+            maximum = np.nanmax(values, axis=1)
+            ranks = np.nanpercentile(values, percentiles, axis=1)
+
+        stats = {}
+        for router, row in self.rows.items():
+            if not samples[row]:
+                stats[router] = {"samples": 0}
+                continue
+            stats[router] = {
+                "samples": int(samples[row]),
+                "min": float(minimum[row]),
+                "avg": round(float(average[row]), 2),
+                "max": float(maximum[row]),
+            }
+            for p, rank in zip(percentiles, ranks[:, row]):
+                stats[router][f"p{p}"] = round(float(rank), 2)
+        return stats
+
+    def snapshot(self, window=None):
+        """Timestamps and samples per router, oldest first, NaN samples as None."""
+        order = self._order(window)
+        timestamps = self.timestamps[order].tolist()
+        routers = {}
+        for router, row in self.rows.items():
+            routers[router] = [None if np.isnan(v) else float(v) for v in self.values[row, order]]
+        return {"timestamps": timestamps, "routers": routers}
+
+
+# extract the cpu value the same way monitor_cpu does: last value of the walk
+def read_cpu(ip, oid):
+    values = list(snmp_walk(ip, oid).values())
+    if values and values[-1].isdigit():
+        return int(values[-1])
+    return None
+
+
+class CpuMonitor:
+    """Samples cpu of many routers every interval seconds on a drift-free schedule.
+
+    Tick n is due at start + n * interval no matter how long sampling took,
+    ticks that are already overdue are skipped and counted in missed_ticks."""
+
+    def __init__(self, router_ips, oid, interval=10, capacity=CPU_HISTORY_CAPACITY,
+                 max_workers=SNMP_MAX_WORKERS):
+        self.router_ips = dict(router_ips)
+        self.oid = oid
+        self.interval = interval
+        self.history = CpuHistory(self.router_ips, capacity)
+        self.max_workers = max_workers
+        self.missed_ticks = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def sample_once(self, executor, timestamp):
+        futures = {router: executor.submit(read_cpu, ip, self.oid) for router, ip in self.router_ips.items()}
+        samples = {router: future.result() for router, future in futures.items()}
+        with self._lock:
+            self.history.record(timestamp, samples)
+        return samples
+
+    def run(self, duration=None):
+        """Sample until duration seconds have passed or stop() is called."""
+        self._stop.clear()
+        start = time.monotonic()
+        start_wall = time.time()
+        tick = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while not self._stop.is_set():
+                if duration is not None and tick * self.interval >= duration:
+                    break
+                self.sample_once(executor, start_wall + tick * self.interval)
+
+                # next tick on the original grid, skipping ticks the sample overran
+                elapsed = time.monotonic() - start
+                next_tick = int(elapsed // self.interval) + 1
+                self.missed_ticks += max(0, next_tick - tick - 1)
+                tick = next_tick
+                self._stop.wait(max(0, start + tick * self.interval - time.monotonic()))
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self, window=None, percentiles=CPU_PERCENTILES):
+        with self._lock:
+            return self.history.stats(window, percentiles)
+
+    def snapshot(self, window=None):
+        with self._lock:
+            snapshot = self.history.snapshot(window)
+        snapshot["interval"] = self.interval
+        snapshot["missed_ticks"] = self.missed_ticks
+        return snapshot
+
+    def render_charts(self, output_dir=".", window=None, small_multiples=False, max_workers=None):
+        """Chart every router's samples, one image per router or one small-multiples image."""
+        from NMcharts import series_from_snapshot, render_cpu_charts, render_small_multiples, SMALL_MULTIPLES_FILE
+
+        series = series_from_snapshot(self.snapshot(window))
+        if small_multiples:
+            return {"all": render_small_multiples(series, os.path.join(output_dir, SMALL_MULTIPLES_FILE))}
+        return render_cpu_charts(series, output_dir, max_workers)
+
+    def export_snapshot(self, filename="cpu_snapshot.json", window=None):
+        snapshot = self.snapshot(window)
+        snapshot["stats"] = self.stats(window)
+        with open(filename, "w", encoding="utf8") as file:
+            json.dump(snapshot, file)
+        print(f"cpu snapshot saved to {filename}")
+
+
+#MAIN
+if __name__ == "__main__":
+    router_ips = load_router_ips("snmp_routers.csv")
+    oids = load_oids("oid_commands.csv")
+
+    monitor = CpuMonitor(router_ips, oids["OID_CPU_UTILIZATION"], interval=10)
+    print("\nmonitoring cpu utilization of all routers for 2 minutes...")
+    monitor.run(duration=120)
+    for router, router_stats in monitor.stats().items():
+        print(f"{router}: {router_stats}")
+    monitor.export_snapshot()
+    for router, path in monitor.render_charts().items():
+        print(f"{router} cpu chart saved to {path}")
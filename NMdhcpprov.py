@@ -0,0 +1,136 @@
+#/usr/bin/env python3
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from ipaddress import IPv4Address, IPv4Network
+from NMsshpool import SSH_POOL
+from NMiosparse import normalize_hw_address
+
+# diff-based dhcp provisioning
+# the wanted config is built as {section header: [child lines]}, compared with the running
+# config read once per device, and only missing lines are pushed in one config session
+
+# dhcp server settings of the lab, one dict per server so other servers can override them
+DHCP_SERVER = {
+    "interface": "FastEthernet0/0",
+    "address": "192.168.20.1",
+    "mask": "255.255.255.0",
+    "network": "192.168.20.0",
+    "excluded": ("192.168.20.1", "192.168.20.10"),
+    "dns": "8.8.8.8",
+    "pool": "DHCP_POOL",
+}
+DHCP_MAX_WORKERS = 16
+
+
+#ios client identifier of an ethernet mac: type byte 01 then the mac in dotted groups of 4
+def ios_client_id(mac):
+    digits = "01" + normalize_hw_address(mac)
+    return ".".join(digits[i:i + 4] for i in range(0, len(digits), 4))
+
+#addresses of the server network that can be reserved, in order from the first_host-th
+#address on, skipping the network and broadcast addresses, the excluded range and the server
+def reservable_hosts(server=DHCP_SERVER, first_host=11):
+    network = IPv4Network(f"{server['network']}/{server['mask']}")
+    low, high = (int(IPv4Address(address)) for address in server["excluded"])
+    reserved = int(IPv4Address(server["address"]))
+    for host in range(int(network.network_address) + first_host, int(network.broadcast_address)):
+        if not low <= host <= high and host != reserved:
+            yield IPv4Address(host)
+
+#one host reservation per mac, R2 -> .11, R3 -> .12 and so on like the lab setup
+#raises ValueError when the server network runs out of addresses
+def build_reservations(mac_addresses, server=DHCP_SERVER, first_host=11, first_pool=2):
+    hosts = reservable_hosts(server, first_host)
+    reservations = []
+    for i, mac in enumerate(mac_addresses):
+        host = next(hosts, None)
+        if host is None:
+            raise ValueError(f"dhcp network {server['network']} {server['mask']} has no address left "
+                             f"for reservation {i + 1} of {len(mac_addresses)}")
+        reservations.append({"pool": f"R{first_pool + i}", "host": str(host), "mask": server["mask"],
+                             "client_id": mac})
+    return reservations
+
+#wanted config sections for a server and its reservations
+def desired_dhcp_config(reservations, server=DHCP_SERVER):
+    config = OrderedDict()
+    config[f"interface {server['interface']}"] = [f"ip address {server['address']} {server['mask']}",
+                                                  "no shutdown"]
+    config["ip dhcp excluded-address {} {}".format(*server["excluded"])] = []
+    config[f"ip dhcp pool {server['pool']}"] = [
+        f"network {server['network']} {server['mask']}",
+        f"default-router {server['address']}",
+        f"dns-server {server['dns']}",
+    ]
+    for reservation in reservations:
+        config[f"ip dhcp pool {reservation['pool']}"] = [
+            f"host {reservation['host']} {reservation['mask']}",
+            f"client-identifier {ios_client_id(reservation['client_id'])}",
+        ]
+    return config
+
+#running config as {top-level line: [indented child lines]}
+def parse_running_config(output):
+    config = OrderedDict()
+    header = None
+    for line in output.split("\n"):
+        stripped = line.strip()
+        if not stripped or stripped.startswith("!"):
+            continue
+        if line[0] == " " and header is not None:
+            config[header].append(stripped)
+        else:
+            header = stripped
+            config.setdefault(header, [])
+    return config
+
+#a "no ..." line is satisfied when the positive form is absent, e.g. no shutdown
+def line_present(line, lines):
+    if line.startswith("no "):
+        return line[3:] not in lines
+    return line in lines
+
+#config commands that turn current into desired, only touching sections that differ
+#prune_pools also removes dhcp pools that are configured but not wanted
+def diff_dhcp_config(current, desired, prune_pools=False):
+    commands = []
+    for header, lines in desired.items():
+        have = current.get(header)
+        if have is None:
+            commands.append(header)
+            if lines:
+                commands.extend(lines)
+                commands.append("exit")
+            continue
+        changes = [line for line in lines if not line_present(line, have)]
+        if changes:
+            commands.extend([header] + changes + ["exit"])
+
+    if prune_pools:
+        for header in current:
+            if header.startswith("ip dhcp pool ") and header not in desired:
+                commands.append(f"no {header}")
+    return commands
+
+#push the dhcp config diff to one server over a pooled session
+def push_dhcp_config(credentials, reservations, server=DHCP_SERVER, prune_pools=False, dry_run=False):
+    result = {"host": credentials["host"], "commands": [], "output": None, "error": None}
+    try:
+        with SSH_POOL.connection(credentials) as net_connect:
+            current = parse_running_config(net_connect.send_command("show running-config"))
+            result["commands"] = diff_dhcp_config(current, desired_dhcp_config(reservations, server), prune_pools)
+            if result["commands"] and not dry_run:
+                result["output"] = net_connect.send_config_set(result["commands"])
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+#provision many dhcp servers in parallel
+#targets is a list of {"credentials": ..., "reservations": [...], "server": optional settings}
+def provision_dhcp_servers(targets, max_workers=DHCP_MAX_WORKERS, prune_pools=False, dry_run=False):
+    def push(target):
+        return push_dhcp_config(target["credentials"], target["reservations"],
+                                target.get("server", DHCP_SERVER), prune_pools, dry_run)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(push, targets))
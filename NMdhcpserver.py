@@ -1,12 +1,21 @@
 #/usr/bin/env python3
 import csv
 import json
-from netmiko import ConnectHandler
+from NMsshpool import SSH_POOL
+from NMdhcpprov import build_reservations, push_dhcp_config
+from NMiosparse import (find_dhcp_binding, get_ipv6_neighbors, neighbors_in_prefix, parse_dhcp_bindings,
+                        SHOW_CACHE)
 import time
 
 #csv and json file paths
 ROUTERS_INFO_CSV = "routers_info.csv"
 MAC_JSON = "mac_addr.json"
+GLOBAL_IPV6_PREFIX = "2001:1111:2222:3333"
+
+#dhcp binding wait: give up after the deadline, poll with doubling delays in between
+DHCP_WAIT_DEADLINE = 60
+DHCP_POLL_INITIAL_DELAY = 1
+DHCP_POLL_MAX_DELAY = 8
 
 #load router credentials from csv
 def load_router_info(file_path):
@@ -38,29 +47,24 @@ def load_mac_addresses():
 #test ssh connection to a router
 def test_ssh_connection(credentials):
     try:
-        net_connect = ConnectHandler(**credentials)
-        net_connect.disconnect()
+        with SSH_POOL.connection(credentials):
+            pass  # the session stays open in the pool for the next step
         return True
     except Exception as e:
         print(f"ssh connection failed for {credentials['host']}: {str(e)}")
         return False
 
 #get r5 global ipv6 address using r4's neighbor table
-def get_r5_ipv6_address(r4_creds):
+def get_r5_ipv6_address(r4_creds, prefix=GLOBAL_IPV6_PREFIX):
     try:
-        net_connect = ConnectHandler(**r4_creds)
-        output = net_connect.send_command("show ipv6 neighbors")
-        net_connect.disconnect()
+        neighbors = get_ipv6_neighbors(r4_creds)
     except Exception as e:
         print(f"failed to retrieve r5 ipv6 address from r4: {str(e)}")
         return None
 
-    r5_ipv6 = None
-    for line in output.split("\n"):
-        parts = line.split()
-        if len(parts) > 1 and parts[0].startswith("2001:1111:2222:3333"):  # match global IPv6
-            r5_ipv6 = parts[0]
-            break  # Stop at the first valid global IPv6
+    # first neighbor with a global address in the prefix
+    matches = neighbors_in_prefix(neighbors, prefix)
+    r5_ipv6 = matches[0].ipv6 if matches else None
 
     if not r5_ipv6:
         print("error: could not determine r5 global ipv6 address from r4.")
@@ -69,51 +73,54 @@ def get_r5_ipv6_address(r4_creds):
     print(f"detected r5 global ipv6 address: {r5_ipv6}")
     return r5_ipv6
 
-#configure dhcp server on r5
+#configure dhcp server on r5, pushing only what differs from its running config
 def configure_dhcp_on_r5(r5_creds, mac_addresses):
+    print("\nconfiguring dhcp on r5...")
     try:
-        net_connect = ConnectHandler(**r5_creds)
-
-        dhcp_config = [
-            "int fa0/0", 
-            "ip address 192.168.20.1 255.255.255.0",
-            "no sh",
-            "exit",
-            "ip dhcp excluded-address 192.168.20.1 192.168.20.10",  # exclude range
-            "ip dhcp pool DHCP_POOL",
-            "network 192.168.20.0 255.255.255.0",
-            "default-router 192.168.20.1",
-            "dns-server 8.8.8.8",
-            "exit",
-            "ip dhcp pool R2", 
-            "host 192.168.20.11 255.255.255.0",
-            f"client-identifier {mac_addresses[0]}",
-            "exit",
-            "ip dhcp pool R3", 
-            "host 192.168.20.12 255.255.255.0",
-            f"client-identifier {mac_addresses[1]}",
-            "exit" 
-            
-        ]
-
-        print("\nconfiguring dhcp on r5...")
-        output = net_connect.send_config_set(dhcp_config)
-        print(output)
-
-        net_connect.disconnect()
-        return True
-    except Exception as e:
-        print(f"failed to configure dhcp on r5: {str(e)}")
+        reservations = build_reservations(mac_addresses)
+    except ValueError as e:
+        print(f"failed to configure dhcp on r5: {e}")
         return False
-
-#retrieve dhcp bindings
-def get_dhcp_clients(r5_creds):
+    result = push_dhcp_config(r5_creds, reservations)
+    if result["error"]:
+        print(f"failed to configure dhcp on r5: {result['error']}")
+        return False
+    if result["commands"]:
+        print(result["output"])
+    else:
+        print("dhcp configuration on r5 already up to date.")
+    return True
+
+#client identifiers that have no binding in a parsed binding table
+def missing_dhcp_clients(bindings, client_ids):
+    return [cid for cid in client_ids if find_dhcp_binding(bindings, cid) is None]
+
+#poll the binding table over one session until every client is bound or the deadline passes
+#returns (last parsed binding table, client identifiers still missing)
+def wait_for_dhcp_bindings(r5_creds, client_ids, deadline=DHCP_WAIT_DEADLINE,
+                           initial_delay=DHCP_POLL_INITIAL_DELAY, max_delay=DHCP_POLL_MAX_DELAY):
+    end = time.monotonic() + deadline
+    delay = initial_delay
+    with SSH_POOL.connection(r5_creds) as net_connect:
+        while True:
+            bindings = parse_dhcp_bindings(net_connect.send_command("show ip dhcp binding"))
+            missing = missing_dhcp_clients(bindings, client_ids)
+            remaining = end - time.monotonic()
+            if not missing or remaining <= 0:
+                break
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, max_delay)
+
+    SHOW_CACHE.put(r5_creds["host"], "show ip dhcp binding", bindings)
+    if missing:
+        print(f"no dhcp binding after {deadline}s for: {', '.join(missing)}")
+    return bindings, missing
+
+#retrieve dhcp bindings, waiting for client_ids to bind when given
+def get_dhcp_clients(r5_creds, client_ids=None, deadline=DHCP_WAIT_DEADLINE):
     try:
-        time.sleep(15)
-        net_connect = ConnectHandler(**r5_creds)
-        output = net_connect.send_command("show ip dhcp binding")
-        net_connect.disconnect()
-        return output
+        bindings, _ = wait_for_dhcp_bindings(r5_creds, client_ids or [], deadline)
+        return bindings.raw
     except Exception as e:
         print(f"failed to retrieve dhcp clients: {str(e)}")
         return None
@@ -172,7 +179,7 @@ if __name__ == "__main__":
 
     # get dhcp clients
     print("\nretrieving dhcp clients...")
-    dhcp_clients = get_dhcp_clients(r5_creds)
+    dhcp_clients = get_dhcp_clients(r5_creds, mac_addresses)
     if dhcp_clients:
         print("\nlist of dhcp clients:\n")
         print(dhcp_clients)
@@ -0,0 +1,172 @@
+#/usr/bin/env python3
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+from ipaddress import IPv6Address
+from NMdhcpserver import ROUTERS_INFO_CSV, load_router_info
+from NMiosparse import get_ipv6_neighbors, normalize_hw_address, normalize_ipv6
+from NMtcpdump import reverse_eui64
+
+# topology discovery
+# starting from the routers in routers_info.csv, neighbor tables are crawled breadth-first,
+# one level at a time in parallel. addresses that share a mac (link-layer or eui-64) are
+# folded into one device, and each device keeps the digest of its last neighbor table so
+# a re-crawl only re-expands devices whose table changed
+
+DISCOVERY_MAX_WORKERS = 16
+TOPOLOGY_FILE = "topology.json"
+
+
+#mac behind an eui-64 interface identifier, None for other addresses
+def eui64_mac(address):
+    try:
+        iid = int(IPv6Address(address.split("%")[0])) & 0xFFFFFFFFFFFFFFFF
+    except ValueError:
+        return None
+    if (iid >> 24) & 0xFFFF != 0xFFFE:
+        return None
+    return normalize_hw_address(reverse_eui64(address.split("%")[0]))
+
+#digest of a neighbor table, unchanged tables hash the same whatever the row order
+def table_digest(table):
+    rows = sorted(f"{normalize_ipv6(r.ipv6)} {normalize_hw_address(r.mac)}" for r in table)
+    return hashlib.sha1("\n".join(rows).encode()).hexdigest()
+
+
+class TopologyCrawler:
+    def __init__(self, router_info, default_credentials=None, max_workers=DISCOVERY_MAX_WORKERS):
+        """router_info is the dict from load_router_info. Devices not listed there are crawled
+        with default_credentials (host replaced) when given, otherwise they stay leaves."""
+        self.credentials = {normalize_ipv6(host): creds for host, creds in router_info.items()}
+        self.default_credentials = default_credentials
+        self.max_workers = max_workers
+        self.nodes = {}  # node id -> {"addresses", "macs", "host", "digest"}
+        self.adjacency = {}  # node id -> node ids seen in its neighbor table
+        self._by_address = {}
+        self._by_mac = {}
+
+    def _credentials_for(self, address):
+        creds = self.credentials.get(normalize_ipv6(address))
+        if creds is None and self.default_credentials:
+            creds = dict(self.default_credentials, host=address)
+        return creds
+
+    def _resolve(self, address, mac=None):
+        """Node id for an address, merging it with a known device that shares the address or a mac."""
+        key = normalize_ipv6(address)
+        macs = {m for m in (normalize_hw_address(mac) if mac else None, eui64_mac(address)) if m}
+
+        node_id = self._by_address.get(key)
+        if node_id is None:
+            node_id = next((self._by_mac[m] for m in macs if m in self._by_mac), None)
+        if node_id is None:
+            node_id = min(macs) if macs else key
+            self.nodes[node_id] = {"addresses": set(), "macs": set(), "host": None, "digest": None}
+            self.adjacency[node_id] = set()
+
+        node = self.nodes[node_id]
+        node["addresses"].add(key)
+        node["macs"].update(macs)
+        self._by_address[key] = node_id
+        for m in macs:
+            self._by_mac.setdefault(m, node_id)
+        return node_id
+
+    @staticmethod
+    def _fetch(creds):
+        try:
+            return get_ipv6_neighbors(creds, refresh=True), None
+        except Exception as e:
+            return None, str(e)
+
+    def _expand(self, frontier, executor):
+        """Crawl frontier ([(node id, credentials)]) level by level until no new device turns up.
+        Returns the ids of devices whose neighbor table changed."""
+        changed = []
+        while frontier:
+            # claim the whole level before reading any table, so a device named by another
+            # device of the same level is not queued again
+            for node_id, creds in frontier:
+                self.nodes[node_id]["host"] = creds["host"]
+            tables = executor.map(lambda item: self._fetch(item[1]), frontier)
+            next_frontier = []
+            for (node_id, creds), (table, error) in zip(frontier, tables):
+                node = self.nodes[node_id]
+                if error:
+                    print(f"discovery failed on {creds['host']}: {error}")
+                    continue
+                digest = table_digest(table)
+                if digest == node["digest"]:
+                    continue
+                node["digest"] = digest
+                changed.append(node_id)
+
+                self.adjacency[node_id] = set()
+                for record in table:
+                    neighbor_id = self._resolve(record.ipv6, record.mac)
+                    if neighbor_id == node_id:
+                        continue
+                    self.adjacency[node_id].add(neighbor_id)
+                    neighbor = self.nodes[neighbor_id]
+                    if neighbor["host"] is not None:
+                        continue
+                    if IPv6Address(record.ipv6.split("%")[0]).is_link_local:
+                        continue  # reach devices on their global address
+                    neighbor_creds = self._credentials_for(record.ipv6)
+                    if neighbor_creds:
+                        neighbor["host"] = neighbor_creds["host"]  # claimed, so it is queued only once
+                        next_frontier.append((neighbor_id, neighbor_creds))
+            frontier = next_frontier
+        return changed
+
+    def crawl(self, seeds=None):
+        """Breadth-first crawl from seeds (hosts), all routers with credentials by default."""
+        seeds = seeds or [creds["host"] for creds in self.credentials.values()]
+        frontier = []
+        for host in seeds:
+            node_id = self._resolve(host)
+            creds = self._credentials_for(host)
+            if creds and self.nodes[node_id]["host"] is None:
+                self.nodes[node_id]["host"] = creds["host"]  # claimed, so it is queued only once
+                frontier.append((node_id, creds))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return self._expand(frontier, executor)
+
+    def recrawl(self, hosts=None):
+        """Re-read the neighbor tables of crawled devices (only those in hosts when given) and
+        re-expand from the ones that changed. Returns the ids of changed devices."""
+        wanted = {normalize_ipv6(h) for h in hosts} if hosts else None
+        frontier = []
+        for node_id, node in self.nodes.items():
+            if node["host"] is None or (wanted and not wanted & node["addresses"]):
+                continue
+            creds = self._credentials_for(node["host"])
+            if creds:
+                frontier.append((node_id, creds))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return self._expand(frontier, executor)
+
+    def to_dict(self):
+        return {
+            node_id: {
+                "addresses": sorted(node["addresses"]),
+                "macs": sorted(node["macs"]),
+                "host": node["host"],
+                "neighbors": sorted(self.adjacency[node_id]),
+            }
+            for node_id, node in self.nodes.items()
+        }
+
+    def save(self, filename=TOPOLOGY_FILE):
+        with open(filename, "w", encoding="utf8") as file:
+            json.dump(self.to_dict(), file, indent=4)
+        print(f"topology saved to {filename}")
+
+
+if __name__ == "__main__":
+    crawler = TopologyCrawler(load_router_info(ROUTERS_INFO_CSV))
+    print("crawling ipv6 neighbor tables...")
+    crawler.crawl()
+    for node_id, node in crawler.to_dict().items():
+        print(f"{node_id} ({node['host'] or 'not crawled'}): {', '.join(node['neighbors']) or 'no neighbors'}")
+    crawler.save()
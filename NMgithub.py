@@ -1,9 +1,12 @@
 #/usr/bin/env python3
 import os
 import shutil
-import git
-from github import Github
 import csv
+import hashlib
+import json
+import time
+from functools import lru_cache
+from NMmetrics import METRICS
 
 
 
@@ -28,79 +31,270 @@ def read_github_token():
 
 
 
-#gitHub API client
-GITHUB_TOKEN = read_github_token()
-github = Github(GITHUB_TOKEN)
+#gitHub API client, built on first use so importing this module needs no token
+#gitpython and pygithub are imported inside the functions for the same reason
+@lru_cache(maxsize=1)
+def get_github():
+    from github import Github
+    return Github(read_github_token())
 
 
 
 
-#create or clone the repository
-def create_or_clone_repo():
-    """Create a new GitHub repository or clone an existing one."""
+#the clone url of the repository is cached here so later runs skip the github api
+REPO_CACHE_FILE = ".github_repo_cache.json"
+REPO_CACHE_TTL = 24 * 3600
+
+#first-time setup: shallow clone of this many commits, or a blob-less partial clone
+#with the full history when CLONE_DEPTH is None
+CLONE_DEPTH = 1
+CLONE_FILTER = "blob:none"
+
+
+
+def load_repo_cache(filename=REPO_CACHE_FILE):
+    try:
+        with open(filename, "r", encoding="utf8") as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_repo_cache(cache, filename=REPO_CACHE_FILE):
+    with open(filename, "w", encoding="utf8") as file:
+        json.dump(cache, file, indent=4)
+
+
+
+#clone url of the repository, looked up once per REPO_CACHE_TTL
+#the repository is only created when github answers 404, other errors are raised
+def get_repo_clone_url(refresh=False):
+    from github import UnknownObjectException
+
+    key = f"{GITHUB_USERNAME}/{REPO_NAME}"
+    cache = load_repo_cache()
+    entry = cache.get(key)
+    if entry and not refresh and time.time() - entry["checked"] < REPO_CACHE_TTL:
+        return entry["clone_url"]
+
+    user = get_github().get_user()
     try:
         # Check repository  exists
-        repo = github.get_user().get_repo(REPO_NAME)
-        print(f"Repository '{REPO_NAME}' already exists. Cloning...")
-        git.Repo.clone_from(repo.clone_url, LOCAL_REPO_PATH)
-    except Exception:
+        repo = user.get_repo(REPO_NAME)
+        print(f"Repository '{REPO_NAME}' already exists.")
+    except UnknownObjectException:
         #if  doesn't exist, create 
         print(f"Repository '{REPO_NAME}' does not exist. Creating...")
-        repo = github.get_user().create_repo(REPO_NAME, private=True)
+        repo = user.create_repo(REPO_NAME, private=True)
         print(f"Repository '{REPO_NAME}' created successfully.")
-        git.Repo.clone_from(repo.clone_url, LOCAL_REPO_PATH)
+
+    cache[key] = {"clone_url": repo.clone_url, "checked": time.time()}
+    save_repo_cache(cache)
+    return repo.clone_url
+
+
+
+#fetch new objects into an existing working copy and fast-forward the current branch
+#shallow working copies stay shallow, the fetch only brings what is missing
+def update_local_repo(repo):
+    origin = repo.remote(name="origin")
+    with METRICS.timer("git_seconds", op="fetch"):
+        origin.fetch()
+
+    if repo.head.is_detached:
+        return
+    branch = repo.active_branch.name
+    remote_ref = f"origin/{branch}"
+    if remote_ref not in [ref.name for ref in origin.refs]:
+        return  # empty remote or branch not pushed yet
+    if repo.head.is_valid():
+        repo.git.merge("--ff-only", remote_ref)
+    else:
+        repo.git.checkout("-B", branch, remote_ref)
+
+
+
+#reuse the working copy when there is one, clone it otherwise
+def create_or_clone_repo(depth=CLONE_DEPTH):
+    """Open the local working copy, cloning (and if needed creating) the GitHub repository first."""
+    import git
+
+    if os.path.isdir(os.path.join(LOCAL_REPO_PATH, ".git")):
+        print(f"Using existing working copy in {LOCAL_REPO_PATH}. Fetching...")
+        repo = git.Repo(LOCAL_REPO_PATH)
+        update_local_repo(repo)
+        return repo
+
+    if os.path.isdir(LOCAL_REPO_PATH) and os.listdir(LOCAL_REPO_PATH):
+        raise RuntimeError(f"{LOCAL_REPO_PATH} exists but is not a git working copy.")
+
+    clone_url = get_repo_clone_url()
+    # no_single_branch keeps the usual fetch refspec, a shallow clone of an empty repository has none otherwise
+    options = {"depth": depth, "no_single_branch": True} if depth else {"filter": CLONE_FILTER}
+    print(f"Cloning '{REPO_NAME}' into {LOCAL_REPO_PATH}...")
+    with METRICS.timer("git_seconds", op="clone"):
+        return git.Repo.clone_from(clone_url, LOCAL_REPO_PATH, **options)
+
+
+
+#content manifest of the files synced into the repository, kept next to the working copy
+#{file: {"size", "mtime_ns", "sha256"}} as of the last commit
+MANIFEST_FILE = LOCAL_REPO_PATH.rstrip("/") + ".manifest.json"
+ARTIFACT_EXTENSIONS = (".txt", ".jpg")
+FICLONE = 0x40049409  # linux ioctl for a copy-on-write clone of a whole file
+GIT_ADD_BATCH = 1000  # paths per git add, keeps the command line short
+
+
+
+def load_manifest(filename=MANIFEST_FILE):
+    try:
+        with open(filename, "r", encoding="utf8") as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_manifest(manifest, filename=MANIFEST_FILE):
+    with open(filename, "w", encoding="utf8") as file:
+        json.dump(manifest, file, indent=4)
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+
+#put a copy of src at dst: reflink when the filesystem can clone, hardlink on the same
+#filesystem, a plain copy otherwise. returns the method used
+def link_or_copy(src, dst):
+    tmp = dst + ".nmsync"
+    try:
+        import fcntl
+        with open(src, "rb") as source, open(tmp, "wb") as target:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+        shutil.copystat(src, tmp)
+        method = "reflink"
+    except (ImportError, OSError):
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        try:
+            os.link(src, tmp)
+            method = "hardlink"
+        except OSError:
+            shutil.copy2(src, tmp)
+            method = "copy"
+    os.replace(tmp, dst)
+    return method
 
 
 
 #cp files to bnew local repository folder
-def copy_files_to_repo():
-    """Copy .txt and .jpg files to the local repository."""
+def copy_files_to_repo(manifest=None):
+    """Copy new or changed .txt and .jpg files to the local repository.
+
+    A file whose size and mtime match the manifest is skipped without reading it, otherwise
+    its hash decides. manifest is updated in place; returns the names of the files copied."""
+    manifest = {} if manifest is None else manifest
     files_to_copy = []
     for file in os.listdir('.'):
-        if file.endswith(('.txt', '.jpg')):
+        if file.endswith(ARTIFACT_EXTENSIONS) and os.path.isfile(file):
             files_to_copy.append(file)
 
     if not os.path.exists(LOCAL_REPO_PATH):
         os.makedirs(LOCAL_REPO_PATH)
 
+    changed = []
     for file in files_to_copy:
-        shutil.copy(file, LOCAL_REPO_PATH)
+        stat = os.stat(file)
+        dst = os.path.join(LOCAL_REPO_PATH, file)
+        entry = manifest.get(file)
+        in_repo = os.path.exists(dst)
+        if in_repo and entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            continue  # untouched since the last sync
+
+        sha256 = file_sha256(file)
+        manifest[file] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256}
+        if in_repo and entry and entry["sha256"] == sha256:
+            continue  # rewritten with the same content
+
+        # a hardlinked copy already shares the inode and the new content with the source
+        if not (in_repo and os.path.samefile(file, dst)):
+            method = link_or_copy(file, dst)
+            METRICS.incr("artifact_sync_total", method=method)
+        changed.append(file)
         print(f"File {file} copied successfully.")
+    return changed
 
 
 
 #push the files to GitHub
-def add_and_commit_files(repo):
-    """Add files to Git and commit changes."""
-    repo.git.add(A=True)  # Add all new/modified files
-    repo.index.commit("Added new .txt and .jpg files")
+def add_and_commit_files(repo, files=None):
+    """Stage the given files (all changes when None) and commit them in one commit.
+    Returns False without committing when nothing is staged."""
+    if files is not None and not files:
+        print("No changed files to commit.")
+        return False
+
+    from git.exc import GitCommandError
+
+    with METRICS.timer("git_seconds", op="commit"):
+        if files is None:
+            repo.git.add(A=True)  # Add all new/modified files
+        else:
+            for i in range(0, len(files), GIT_ADD_BATCH):
+                repo.git.add("--", *files[i:i + GIT_ADD_BATCH])
+        try:
+            repo.git.diff("--cached", "--quiet")
+            print("No changed files to commit.")
+            return False
+        except GitCommandError:
+            pass  # exit status 1, there are staged changes
+        repo.index.commit(f"Update {len(files)} .txt and .jpg files" if files else "Added new .txt and .jpg files")
     print("Files committed.")
+    return True
+
+
+
+#commits of the current branch that origin does not have yet, e.g. from a run whose push failed
+def has_unpushed_commits(repo):
+    if repo.head.is_detached or not repo.head.is_valid():
+        return False
+    branch = repo.active_branch.name
+    if f"origin/{branch}" not in [ref.name for ref in repo.remote(name="origin").refs]:
+        return True
+    return bool(repo.git.rev_list(f"origin/{branch}..{branch}"))
 
 
 
 def push_to_github(repo):
     """Push the changes to the GitHub repository."""
     origin = repo.remote(name="origin")
-    origin.push()
+    with METRICS.timer("git_seconds", op="push"):
+        origin.push()
     print("Changes pushed to GitHub.")
 
 
 
 def main():
     """Main function to execute the script."""
-    create_or_clone_repo()
-
-    #open repository
-    repo = git.Repo(LOCAL_REPO_PATH)
+    #open repository, cloning it on the first run
+    repo = create_or_clone_repo()
 
-    #cp files  local repository
-    copy_files_to_repo()
+    #cp new or changed files to the local repository
+    manifest = load_manifest()
+    changed = copy_files_to_repo(manifest)
 
-    # 
-    add_and_commit_files(repo)
+    #one commit for everything that changed, the manifest is saved only after it
+    #so files of a failed commit are picked up again on the next run
+    committed = add_and_commit_files(repo, changed)
+    save_manifest(manifest)
 
     # Push changes b
-    push_to_github(repo)
+    if committed or has_unpushed_commits(repo):
+        push_to_github(repo)
+    else:
+        print("Nothing changed, skipping commit and push.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,142 @@
+#/usr/bin/env python3
+import base64
+import json
+import os
+import time
+from array import array
+from collections import namedtuple
+
+# interface status change detection
+# each router's ifOperStatus is kept as a sorted array of the ifIndexes it reported and
+# their status bytes in the same order, so sparse ifIndex numbering (nx-os starts ethernet
+# ports at 436207616) costs one slot per interface. a poll is packed the same way and
+# compared with one vectorized pass, so only the interfaces that changed turn into events
+
+IFSTATE_FILE = "interface_state.json"
+
+# ifOperStatus values (RFC 2863)
+IF_OPER_STATUS = {
+    0: "absent",  # not in the poll
+    1: "up",
+    2: "down",
+    3: "testing",
+    4: "unknown",
+    5: "dormant",
+    6: "notPresent",
+    7: "lowerLayerDown",
+}
+STATUS_CODES = {"up": 1, "down": 2}
+
+# indexes is an array('I') of ifIndexes in ascending order, status the matching ifOperStatus bytes
+InterfaceState = namedtuple("InterfaceState", ["indexes", "status"])
+
+
+#pack a raw ifOperStatus walk ({oid: value}) into an InterfaceState
+def pack_walk(raw_status):
+    return _pack({int(oid[oid.rfind(".") + 1:]): int(value) for oid, value in raw_status.items()})
+
+#pack an interface_status dict from fetch_snmp_data ({"1": "up", ...})
+def pack_status(interface_status):
+    return _pack({int(ifindex): STATUS_CODES.get(status, 4) for ifindex, status in interface_status.items()})
+
+def _pack(statuses):
+    indexes = sorted(statuses)
+    return InterfaceState(array("I", indexes), bytes(statuses[i] for i in indexes))
+
+
+class InterfaceStateTracker:
+    def __init__(self):
+        self.states = {}  # router -> InterfaceState
+
+    def update(self, router, state, ts=None, complete=True):
+        """Store a packed poll for router and return its status transitions as events.
+
+        The first poll of a router only sets the baseline and an empty poll is ignored, it
+        means the walk failed. An interface missing from the poll only counts as gone when
+        complete says the walk finished, otherwise it keeps its last known status."""
+        ts = time.time() if ts is None else ts
+        if not state.indexes:
+            return []
+        old = self.states.get(router)
+        if old is None:
+            self.states[router] = state
+            return []
+        if old == state:
+            return []
+
+        import numpy as np  # only needed once something changed
+
+        new_indexes = np.asarray(state.indexes, dtype=np.int64)
+        new_status = np.frombuffer(state.status, dtype=np.uint8)
+        if old.indexes == state.indexes:
+            indexes = new_indexes
+            before = np.frombuffer(old.status, dtype=np.uint8)
+            after = new_status
+            polled = None
+        else:
+            # line both sides up on the union of their ifIndexes, missing ones read as 0
+            old_indexes = np.asarray(old.indexes, dtype=np.int64)
+            indexes = np.union1d(old_indexes, new_indexes)
+            before = np.zeros(len(indexes), dtype=np.uint8)
+            before[np.searchsorted(indexes, old_indexes)] = np.frombuffer(old.status, dtype=np.uint8)
+            polled = np.searchsorted(indexes, new_indexes)
+            if complete:
+                after = np.zeros(len(indexes), dtype=np.uint8)
+            else:
+                after = before.copy()  # interfaces the walk did not reach keep their status
+            after[polled] = new_status
+
+        changed = np.flatnonzero(before != after)
+        if complete:
+            self.states[router] = state
+        else:
+            keep = after != 0
+            self.states[router] = InterfaceState(array("I", indexes[keep].tolist()), after[keep].tobytes())
+        return [
+            {
+                "router": router,
+                "ifindex": int(indexes[i]),
+                "old": IF_OPER_STATUS.get(int(before[i]), "unknown"),
+                "new": IF_OPER_STATUS.get(int(after[i]), "unknown"),
+                "ts": ts,
+            }
+            for i in changed
+        ]
+
+    def update_walk(self, router, raw_status, ts=None, complete=True):
+        return self.update(router, pack_walk(raw_status), ts, complete)
+
+    def update_snmp_data(self, snmp_data, ts=None, report=None):
+        """Events for every router of a fetch_snmp_data result.
+
+        report is the per-router report of fetch_snmp_data_async, a router whose status walk
+        has no error there is complete. Without a report it is unknown whether a walk ran to
+        the end, so interfaces missing from a poll are not reported as gone."""
+        events = []
+        for router, data in snmp_data.items():
+            complete = report is not None and router in report \
+                and "OID_IF_STATUS" not in report[router]["errors"]
+            events.extend(self.update(router, pack_status(data["interface_status"]), ts, complete))
+        return events
+
+    def save(self, filename=IFSTATE_FILE):
+        with open(filename, "w", encoding="utf8") as file:
+            json.dump({
+                router: {"indexes": state.indexes.tolist(), "status": base64.b64encode(state.status).decode()}
+                for router, state in self.states.items()
+            }, file)
+
+    @classmethod
+    def load(cls, filename=IFSTATE_FILE):
+        tracker = cls()
+        if os.path.exists(filename):
+            with open(filename, "r", encoding="utf8") as file:
+                for router, state in json.load(file).items():
+                    tracker.states[router] = InterfaceState(array("I", state["indexes"]),
+                                                            base64.b64decode(state["status"]))
+        return tracker
+
+
+def display_interface_events(events):
+    for event in events:
+        print(f"{event['router']} interface {event['ifindex']}: {event['old']} -> {event['new']}")
@@ -0,0 +1,147 @@
+#/usr/bin/env python3
+import re
+import threading
+import time
+from collections import namedtuple
+from ipaddress import IPv6Address, IPv6Network
+from NMsshpool import SSH_POOL
+
+# typed records for ios show commands, indexed for repeated lookups
+# parsed tables are cached per device and command for SHOW_CACHE_TTL seconds
+
+SHOW_CACHE_TTL = 30
+
+Ipv6Neighbor = namedtuple("Ipv6Neighbor", "ipv6 age mac state interface")
+DhcpBinding = namedtuple("DhcpBinding", "ip client_id lease type state interface")
+
+DHCP_BINDING_TYPES = ("Automatic", "Manual", "Static")
+IPV4_RE = re.compile(r"^\d+\.\d+\.\d+\.\d+$")
+
+
+#hex digits of a mac or client identifier, e.g. CA:02:16:89:00:00 and 01ca.0216.8900.00
+def normalize_hw_address(value):
+    return re.sub(r"[^0-9a-f]", "", value.lower())
+
+#compressed lower-case form, so C805:17FF:FE5F:0 and c805:17ff:fe5f:0 index the same
+def normalize_ipv6(value):
+    try:
+        return str(IPv6Address(value.split("%")[0]))
+    except ValueError:
+        return value.lower()
+
+
+class IndexedTable:
+    """Parsed records with a hash index per field. indexes maps a field name to the
+    function that normalizes both stored values and lookup keys."""
+
+    def __init__(self, records, indexes, raw=None):
+        self.records = records
+        self.raw = raw  # command output the records came from
+        self._normalizers = indexes
+        self._indexes = {field: {} for field in indexes}
+        for record in records:
+            for field, normalize in indexes.items():
+                value = getattr(record, field)
+                if value:
+                    self._indexes[field].setdefault(normalize(value), []).append(record)
+
+    def lookup(self, field, value):
+        return self._indexes[field].get(self._normalizers[field](value), [])
+
+    def first(self, field, value):
+        matches = self.lookup(field, value)
+        return matches[0] if matches else None
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+
+NEIGHBOR_INDEXES = {"ipv6": normalize_ipv6, "mac": normalize_hw_address, "interface": str.lower}
+BINDING_INDEXES = {"ip": str, "client_id": normalize_hw_address, "interface": str.lower}
+
+
+#show ipv6 neighbors
+#IPv6 Address                              Age Link-layer Addr State Interface
+#2001:1111:2222:3333:C805:17FF:FE5F:0        0 ca05.17ff.0000  REACH Fa0/0
+def parse_ipv6_neighbors(output):
+    records = []
+    for line in output.split("\n"):
+        parts = line.split()
+        if len(parts) < 5 or ":" not in parts[0]:
+            continue  # header, blank or truncated line
+        records.append(Ipv6Neighbor(parts[0], parts[1], parts[2], parts[3], parts[4]))
+    return IndexedTable(records, NEIGHBOR_INDEXES, output)
+
+#show ip dhcp binding
+#IP address       Client-ID/Hardware address  Lease expiration      Type       State   Interface
+#192.168.20.11    01ca.0216.8900.00           Infinite              Manual     Active  FastEthernet0/0
+#older ios releases leave out the State and Interface columns
+def parse_dhcp_bindings(output):
+    records = []
+    for line in output.split("\n"):
+        parts = line.split()
+        if len(parts) < 3 or not IPV4_RE.match(parts[0]):
+            continue
+        type_index = next((i for i, p in enumerate(parts[2:], 2) if p in DHCP_BINDING_TYPES), len(parts))
+        rest = parts[type_index:] + [None, None, None]
+        records.append(DhcpBinding(parts[0], parts[1], " ".join(parts[2:type_index]), rest[0], rest[1], rest[2]))
+    return IndexedTable(records, BINDING_INDEXES, output)
+
+#neighbors whose address falls inside prefix, e.g. 2001:1111:2222:3333, in table order
+def neighbors_in_prefix(table, prefix):
+    network = IPv6Network(f"{prefix}::/64") if "/" not in prefix else IPv6Network(prefix)
+    matches = []
+    for record in table:
+        try:
+            if IPv6Address(record.ipv6.split("%")[0]) in network:
+                matches.append(record)
+        except ValueError:
+            continue
+    return matches
+
+#binding for a mac, ios stores ethernet client identifiers with a 01 type byte in front
+def find_dhcp_binding(table, mac):
+    return table.first("client_id", mac) or table.first("client_id", "01" + normalize_hw_address(mac))
+
+
+class ShowCommandCache:
+    """Parsed show command output per (host, command), reused until ttl runs out."""
+
+    def __init__(self, ttl=SHOW_CACHE_TTL, pool=SSH_POOL):
+        self.ttl = ttl
+        self.pool = pool
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def put(self, host, command, table):
+        with self._lock:
+            self._tables[(host, command)] = (time.monotonic(), table)
+
+    def get(self, credentials, command, parser, refresh=False):
+        key = (credentials["host"], command)
+        with self._lock:
+            cached = self._tables.get(key)
+        if cached and not refresh and time.monotonic() - cached[0] < self.ttl:
+            return cached[1]
+
+        with self.pool.connection(credentials) as net_connect:
+            table = parser(net_connect.send_command(command))
+        self.put(credentials["host"], command, table)
+        return table
+
+    def invalidate(self, host=None):
+        with self._lock:
+            for key in [k for k in self._tables if host is None or k[0] == host]:
+                del self._tables[key]
+
+
+SHOW_CACHE = ShowCommandCache()
+
+def get_ipv6_neighbors(credentials, refresh=False, cache=SHOW_CACHE):
+    return cache.get(credentials, "show ipv6 neighbors", parse_ipv6_neighbors, refresh)
+
+def get_dhcp_bindings(credentials, refresh=False, cache=SHOW_CACHE):
+    return cache.get(credentials, "show ip dhcp binding", parse_dhcp_bindings, refresh)
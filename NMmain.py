@@ -1,70 +1,199 @@
-import NMtcpdump
-import NMdhcp
-import NMsnmp
-import NMgithub
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from NMmetrics import METRICS, METRICS_JSON_FILE, METRICS_PROM_FILE, profile
+
+# every stage imports its own modules when it runs, so a cron job that runs one stage
+# (python3 NMmain.py snmp) does not pay for scapy, netmiko, easysnmp or the github client
+STAGE_MODULES = {
+    "pcap": ("NMtcpdump",),
+    "dhcp": ("NMdhcpserver",),
+    "snmp": ("NMsnmp", "NMsnapshot", "NMifstate"),
+    "github": ("NMgithub",),
+}
+
+# stages run as soon as the stages they depend on succeeded, independent stages run
+# side by side. each stage gets the outputs of its dependencies as inputs and a failed
+# stage only skips the stages that depend on it
+Stage = namedtuple("Stage", "name func deps")
+
+class StageError(Exception):
+    """Raised by a stage that cannot continue, the message is reported as the error."""
+
+def extract_stage(inputs):
+    import NMtcpdump
 
-def main():
     #extract MAC addresses from IPv6 addresses
     print("Extracting MAC addresses from IPv6 addresses...")
-    mac_ipv6_map = NMtcpdump.extract_mac_ipv6("c1_from_r2_r3.pcap")
+    mac_ipv6_map = NMtcpdump.extract_mac_ipv6("c1_from_r2_r3.pcap", stream=True)
     NMtcpdump.save_mapping(mac_ipv6_map, "mac_addr.json")
-    
+
     print("\nExtracted MAC from IPv6 address:")
     for ipv6, mac in mac_ipv6_map.items():
         print(f"IPv6: {ipv6} is MAC: {mac}")
-    
+    return mac_ipv6_map
 
+def dhcp_stage(inputs):
+    import NMdhcpserver as NMdhcp
 
     #configure DHCP on R5
     print("\nConfiguring DHCP on R5...")
     router_info = NMdhcp.load_router_info("routers_info.csv")
-    mac_addresses = NMdhcp.load_mac_addresses()
-    
+    # MACs come straight from the pcap stage, mac_addr.json is only read when it did not run
+    if "pcap" in inputs:
+        mac_addresses = list(inputs["pcap"].values())
+    else:
+        mac_addresses = NMdhcp.load_mac_addresses()
+
 
 
     if not router_info or not mac_addresses:
-        print("Error: No router data or MAC addresses found.")
-        return
-    
+        raise StageError("No router data or MAC addresses found.")
+
 
 
     #get R4 credentials
     r4_creds = router_info.get("db8:1::2", None)
     if not r4_creds:
-        print("Error: Could not find R4 credentials.")
-        return
-    
+        raise StageError("Could not find R4 credentials.")
+
     #get R5 IPv6 address from R4
     r5_ipv6 = NMdhcp.get_r5_ipv6_address(r4_creds)
     if not r5_ipv6:
-        print("Error: Could not get R5 IPv6 address from R4.")
-        return
+        raise StageError("Could not get R5 IPv6 address from R4.")
 
     #get R5 credentials and configure DHCP
     r5_creds = router_info.get(r5_ipv6)
     if not r5_creds:
-        print(f"Error: No credentials found for R5 ({r5_ipv6}).")
-        return
-    
+        raise StageError(f"No credentials found for R5 ({r5_ipv6}).")
+
     if not NMdhcp.configure_dhcp_on_r5(r5_creds, mac_addresses):
-        print("Error: Failed to configure DHCP on R5.")
-        return
-    
+        raise StageError("Failed to configure DHCP on R5.")
+    return r5_creds
+
+def snmp_stage(inputs):
+    import NMsnmp
+    import NMsnapshot
+    import NMifstate
+
     # 3 get SNMP data
     print("\nFetching SNMP data...")
     router_ips = NMsnmp.load_router_ips("snmp_routers.csv")
     oids = NMsnmp.load_oids("oid_commands.csv")
-    snmp_data = NMsnmp.fetch_snmp_data(router_ips, oids)
-    
-    #saving SNMP data to a file
+    snmp_data = NMsnmp.fetch_snmp_data_concurrent(router_ips, oids)
+
+    #saving SNMP data to a file and appending the changes to the snapshot history
     NMsnmp.save_snmp_data(snmp_data)
-    
+    NMsnapshot.SnapshotStore().append(snmp_data)
+
+    #report interface status changes since the last run
+    tracker = NMifstate.InterfaceStateTracker.load()
+    NMifstate.display_interface_events(tracker.update_snmp_data(snmp_data))
+    tracker.save()
+
     #Display SNMP data in table
     NMsnmp.display_snmp_data(snmp_data)
-    
+    return snmp_data
+
+def github_stage(inputs):
+    import NMgithub
+
     #gitHub section
     print("\nPushing changes to GitHub...")
     NMgithub.main()
+    return True
+
+#github uploads snmp_data.txt, so it waits for snmp but not for the dhcp push
+PIPELINE = [
+    Stage("pcap", extract_stage, ()),
+    Stage("dhcp", dhcp_stage, ("pcap",)),
+    Stage("snmp", snmp_stage, ()),
+    Stage("github", github_stage, ("snmp",)),
+]
+STAGES = {stage.name: stage for stage in PIPELINE}
+
+# NM_PROFILE=<prefix> profiles every stage with cProfile into <prefix>.<stage>.prof
+# the stages then run one at a time, python 3.12+ allows only one active profiler per process
+# and a profile of one stage would pick up the others' threads anyway
+PROFILE_ENV = "NM_PROFILE"
+
+def timed_stage(stage, inputs):
+    prefix = os.environ.get(PROFILE_ENV)
+    start = time.perf_counter()
+    try:
+        with profile(f"{prefix}.{stage.name}.prof" if prefix else None), \
+                METRICS.timer("stage_seconds", stage=stage.name):
+            return stage.func(inputs), None, time.perf_counter() - start
+    except Exception as e:
+        return None, e, time.perf_counter() - start
+
+#run the selected stages (all by default) as a dependency graph
+#dependencies that are not selected are left out, their stage then falls back to files on disk
+#stages run serially when NM_PROFILE is set
+#returns ({stage: output}, {stage: {"status", "seconds", "error"}})
+def run_pipeline(pipeline=PIPELINE, selected=None):
+    stages = [stage for stage in pipeline if not selected or stage.name in selected]
+    names = {stage.name for stage in stages}
+    pending = {stage.name: stage for stage in stages}
+    outputs, report, running = {}, {}, {}
+
+    workers = 1 if os.environ.get(PROFILE_ENV) else max(1, len(stages))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while pending or running:
+            progress = False
+            for name, stage in list(pending.items()):
+                deps = [dep for dep in stage.deps if dep in names]
+                if any(report.get(dep, {}).get("status") in ("failed", "skipped") for dep in deps):
+                    report[name] = {"status": "skipped", "seconds": 0.0, "error": "dependency did not succeed"}
+                    del pending[name]
+                    progress = True
+                elif all(report.get(dep, {}).get("status") == "ok" for dep in deps):
+                    inputs = {dep: outputs[dep] for dep in deps}
+                    running[executor.submit(timed_stage, stage, inputs)] = name
+                    del pending[name]
+                    progress = True
+            if not running:
+                if not progress:
+                    # nothing can start any more, e.g. stages that depend on each other
+                    for name in pending:
+                        report[name] = {"status": "failed", "seconds": 0.0, "error": "unsatisfiable dependencies"}
+                    pending.clear()
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                output, error, seconds = future.result()
+                if error is None:
+                    outputs[name] = output
+                    report[name] = {"status": "ok", "seconds": round(seconds, 3), "error": None}
+                else:
+                    print(f"Error: {error}")
+                    report[name] = {"status": "failed", "seconds": round(seconds, 3), "error": str(error)}
+
+    return outputs, report
+
+def display_pipeline_report(report, wall_time):
+    print("\nPipeline summary:")
+    for name, entry in report.items():
+        error = f" ({entry['error']})" if entry["error"] else ""
+        print(f"{name:<8} {entry['status']:<8} {entry['seconds']:>8.2f}s{error}")
+    print(f"total wall time {wall_time:.2f}s, sum of stages {sum(e['seconds'] for e in report.values()):.2f}s")
+
+def main(stages=None):
+    unknown = [name for name in stages or [] if name not in STAGES]
+    if unknown:
+        print(f"Error: unknown stage(s) {', '.join(unknown)}, choose from {', '.join(STAGES)}.")
+        return
+    start = time.perf_counter()
+    _, report = run_pipeline(PIPELINE, stages)
+    display_pipeline_report(report, time.perf_counter() - start)
+
+    #per-call timings of snmp, ssh, pcap and git for this run
+    METRICS.save(METRICS_JSON_FILE)
+    METRICS.save(METRICS_PROM_FILE)
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1:])
@@ -0,0 +1,180 @@
+#/usr/bin/env python3
+import cProfile
+import json
+import math
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# in-process metrics for the NM modules
+# counters and latency histograms keyed by name and labels, shared through METRICS and
+# written out as json or prometheus text at the end of a run, so a slow poll cycle shows
+# whether the time went to snmp, ssh, pcap dissection or git
+
+METRICS_JSON_FILE = "nm_metrics.json"
+METRICS_PROM_FILE = "nm_metrics.prom"
+
+# histogram bucket upper bounds in seconds, the last one catches everything
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, math.inf)
+
+
+def metric_key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "min": round(self.min, 6) if self.count else None,
+            "max": round(self.max, 6),
+            "p50": round(self.quantile(0.5), 6) if self.count else None,
+            "p95": round(self.quantile(0.95), 6) if self.count else None,
+        }
+
+
+class Metrics:
+    def __init__(self):
+        self.counters = {}  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> Histogram
+        self._lock = threading.Lock()
+
+    def incr(self, name, value=1, **labels):
+        key = metric_key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = metric_key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Record the duration of the block in histogram name, failures also count in errors_total."""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.incr("errors_total", metric=name, **labels)
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def timed(self, name, **labels):
+        """Decorator form of timer."""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "counters": [{"name": name, "labels": dict(labels), "value": value}
+                             for (name, labels), value in sorted(self.counters.items())],
+                "histograms": [dict({"name": name, "labels": dict(labels)}, **histogram.to_dict())
+                               for (name, labels), histogram in sorted(self.histograms.items())],
+            }
+
+    def to_prometheus(self, prefix="nm_"):
+        lines = []
+        with self._lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f"{prefix}{name}{format_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == math.inf else repr(bound)
+                    lines.append(f"{prefix}{name}_bucket{format_labels(labels, [('le', le)])} {cumulative}")
+                lines.append(f"{prefix}{name}_sum{format_labels(labels)} {histogram.sum}")
+                lines.append(f"{prefix}{name}_count{format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def save(self, filename=METRICS_JSON_FILE):
+        """Write json, or prometheus text when filename ends in .prom."""
+        with open(filename, "w", encoding="utf8") as file:
+            if filename.endswith(".prom"):
+                file.write(self.to_prometheus())
+            else:
+                json.dump(self.to_dict(), file, indent=4)
+
+
+METRICS = Metrics()
+
+
+#profile the block with cProfile when path is set, stats are dumped to path
+#only one profiler can be active at a time on python 3.12+, so do not nest or overlap calls
+#across threads, run profiled work serially instead
+@contextmanager
+def profile(path=None, top=0):
+    if not path:
+        yield None
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        if top:
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(top)
+
+
+def display_metrics(metrics=METRICS):
+    for entry in metrics.to_dict()["histograms"]:
+        labels = ",".join(f"{k}={v}" for k, v in entry["labels"].items())
+        print(f"{entry['name']:<24} {labels:<28} n={entry['count']:<6} total={entry['sum']:.3f}s "
+              f"max={entry['max']:.3f}s p95<={entry['p95']}")
@@ -0,0 +1,407 @@
+#/usr/bin/env python3
+import asyncio
+import bisect
+import random
+import socket
+import threading
+import time
+from ipaddress import IPv4Address, IPv6Address
+from NMdhcpprov import parse_running_config
+from NMsnmpasync import (TAG_INTEGER, TAG_GET, TAG_GETNEXT, TAG_GETBULK, TAG_RESPONSE,
+                         encode_message, decode_message)
+
+# local stand-ins for the lab routers, used by NMbench
+# SimulatedSnmpAgent answers v2c GET/GETNEXT/GETBULK for synthetic interface tables,
+# FakeIosServer is an ssh server with just enough of the ios cli for netmiko and the dhcp code
+
+SIM_SNMP_PORT = 16100
+SIM_COMMUNITY = "midterm"
+
+TAG_IPADDRESS = 0x40
+TAG_GAUGE = 0x42
+TAG_END_OF_MIB_VIEW = 0x82
+
+OID_IF_IPV4 = "1.3.6.1.2.1.4.20.1.1"
+OID_IF_IPV6 = "1.3.6.1.2.1.4.34.1.3"
+OID_IF_STATUS = "1.3.6.1.2.1.2.2.1.8"
+OID_CPU_UTILIZATION = "1.3.6.1.4.1.9.9.109.1.1.1.1.6"
+# same names as oid_commands.csv
+SIM_OIDS = {
+    "OID_IF_IPV4": OID_IF_IPV4,
+    "OID_IF_IPV6": OID_IF_IPV6,
+    "OID_IF_STATUS": OID_IF_STATUS,
+    "OID_CPU_UTILIZATION": OID_CPU_UTILIZATION,
+}
+
+
+def oid_key(oid):
+    return tuple(int(x) for x in oid.strip(".").split("."))
+
+#one router's tables with rows interfaces: ipv4 addresses, ipv6 addresses (ipAddressIfIndex),
+#ifOperStatus and one cpu row, as {oid: (tag, raw value)}
+def synthetic_tables(rows, seed=1):
+    rng = random.Random(seed)
+    table = {}
+    for ifindex in range(1, rows + 1):
+        ipv4 = IPv4Address(0x0A000000 + ifindex)
+        table[f"{OID_IF_IPV4}.{ipv4}"] = (TAG_IPADDRESS, ipv4.packed)
+        ipv6 = IPv6Address(f"2001:1111:2222:{ifindex:x}::1").packed
+        table[f"{OID_IF_IPV6}.2.16." + ".".join(str(b) for b in ipv6)] = (TAG_INTEGER, bytes([0, ifindex >> 8 & 0xFF, ifindex & 0xFF]))
+        table[f"{OID_IF_STATUS}.{ifindex}"] = (TAG_INTEGER, bytes([1 if rng.random() < 0.8 else 2]))
+    table[f"{OID_CPU_UTILIZATION}.1"] = (TAG_GAUGE, bytes([rng.randrange(100)]))
+    return table
+
+
+class _AgentProtocol(asyncio.DatagramProtocol):
+    def __init__(self, agent):
+        self.agent = agent
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        reply = self.agent.respond(data)
+        if reply is None:
+            return
+        delay = self.agent.latency + self.agent.rng.uniform(0, self.agent.jitter)
+        if delay:
+            asyncio.get_running_loop().call_later(delay, self.send, reply, addr)
+        else:
+            self.send(reply, addr)
+
+    def send(self, reply, addr):
+        # delayed replies still due when the agent stops are dropped
+        if not self.transport.is_closing():
+            self.transport.sendto(reply, addr)
+
+
+class SimulatedSnmpAgent:
+    """SNMP v2c agent on its own event loop thread, answering on every address in hosts.
+
+    Every host serves the same synthetic tables of rows interfaces, replies are held back
+    latency seconds plus up to jitter seconds without blocking other requests."""
+
+    def __init__(self, hosts=("127.0.0.1",), port=SIM_SNMP_PORT, rows=10, latency=0.0, jitter=0.0,
+                 community=SIM_COMMUNITY, seed=1):
+        self.hosts = list(hosts)
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.community = community
+        self.rng = random.Random(seed)
+        self.requests = 0
+        table = synthetic_tables(rows, seed)
+        self._keys = sorted(oid_key(oid) for oid in table)
+        self._oids = [".".join(str(x) for x in key) for key in self._keys]
+        self._values = [table[oid] for oid in self._oids]
+        self._loop = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    def _next(self, oid):
+        i = bisect.bisect_right(self._keys, oid_key(oid))
+        if i == len(self._keys):
+            return oid, (TAG_END_OF_MIB_VIEW, b"")
+        return self._oids[i], self._values[i]
+
+    def _get(self, oid):
+        i = bisect.bisect_left(self._keys, oid_key(oid))
+        if i < len(self._keys) and self._keys[i] == oid_key(oid):
+            return oid, self._values[i]
+        return oid, (0x81, b"")  # noSuchInstance
+
+    def respond(self, data):
+        try:
+            pdu_type, request_id, field1, field2, varbinds, community = decode_message(data)
+        except (IndexError, ValueError):
+            return None
+        if community != self.community:
+            return None  # v2c agents drop wrong communities silently
+        self.requests += 1
+        oids = [oid for oid, _, _ in varbinds]
+
+        if pdu_type == TAG_GET:
+            answers = [self._get(oid) for oid in oids]
+        elif pdu_type == TAG_GETNEXT:
+            answers = [self._next(oid) for oid in oids]
+        elif pdu_type == TAG_GETBULK:
+            # field1/field2 carry non-repeaters/max-repetitions, repeated rows are interleaved
+            non_repeaters, max_repetitions = max(0, field1), max(0, field2)
+            answers = [self._next(oid) for oid in oids[:non_repeaters]]
+            cursors = oids[non_repeaters:]
+            for _ in range(max_repetitions if cursors else 0):
+                row = [self._next(oid) for oid in cursors]
+                answers.extend(row)
+                cursors = [oid for oid, _ in row]
+                if all(value[0] == TAG_END_OF_MIB_VIEW for _, value in row):
+                    break
+        else:
+            return None
+        return encode_message(TAG_RESPONSE, request_id, [oid for oid, _ in answers], self.community,
+                              values=[value for _, value in answers])
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        transports = []
+        for host in self.hosts:
+            family = socket.AF_INET6 if ":" in host else socket.AF_INET
+            transport, _ = self._loop.run_until_complete(self._loop.create_datagram_endpoint(
+                lambda: _AgentProtocol(self), local_addr=(host, self.port), family=family))
+            transports.append(transport)
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            for transport in transports:
+                transport.close()
+            self._loop.run_until_complete(asyncio.sleep(0))
+            self._loop.close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+#ios prompt suffix per config sub-mode, keyed by the top-level line that enters it
+IOS_SUBMODES = {"interface ": "config-if", "ip dhcp pool ": "dhcp-config", "router ": "config-router"}
+#lines that are global config even when typed inside a sub-mode
+IOS_GLOBAL_PREFIXES = ("interface ", "router ", "hostname ", "ip dhcp ", "ip route ", "ipv6 route ",
+                       "no interface ", "no ip dhcp ", "no ip route ", "no ipv6 route ")
+
+
+class FakeIosServer:
+    """SSH server with a minimal ios cli: paging/width commands, show running-config,
+    show ip dhcp binding, show ipv6 neighbors and configure terminal.
+
+    Config lines update running_config, dhcp pools with a host and client-identifier show up
+    as bindings bind_delay seconds after they were configured. Every command takes
+    latency seconds before its output is written."""
+
+    def __init__(self, host="127.0.0.1", port=0, hostname="R5", username="admin", password="admin",
+                 running_config="", neighbors=(), latency=0.0, bind_delay=0.0):
+        self.host = host
+        self.port = port
+        self.hostname = hostname
+        self.username = username
+        self.password = password
+        self.running_config = parse_running_config(running_config)
+        self.neighbors = list(neighbors)  # (ipv6, mac) pairs
+        self.latency = latency
+        self.bind_delay = bind_delay
+        self.commands = 0
+        self._bound_at = {}  # pool header -> time its reservation was configured
+        self._lock = threading.Lock()
+        self._sock = None
+        self._host_key = None
+        self._thread = None
+
+    def credentials(self):
+        """Netmiko credentials for this server, in the shape of load_router_info."""
+        return {"device_type": "cisco_ios", "host": self.host, "port": self.port,
+                "username": self.username, "password": self.password}
+
+    # ios output
+    def show_running_config(self):
+        lines = ["Building configuration...", "", "Current configuration : 1024 bytes", "!",
+                 f"hostname {self.hostname}", "!"]
+        with self._lock:
+            for header, children in self.running_config.items():
+                lines.append(header)
+                lines.extend(f" {child}" for child in children)
+                lines.append("!")
+        lines.append("end")
+        return "\n".join(lines)
+
+    def show_dhcp_binding(self):
+        lines = ["Bindings from all pools not associated with VRF:",
+                 "IP address          Client-ID/              Lease expiration        Type",
+                 "                    Hardware address/",
+                 "                    User name"]
+        now = time.monotonic()
+        with self._lock:
+            for header, children in self.running_config.items():
+                if not header.startswith("ip dhcp pool ") or now - self._bound_at.get(header, now) < self.bind_delay:
+                    continue
+                host = next((c.split()[1] for c in children if c.startswith("host ")), None)
+                client_id = next((c.split()[1] for c in children if c.startswith("client-identifier ")), None)
+                if host and client_id:
+                    lines.append(f"{host:<20}{client_id:<24}Infinite                Manual")
+        return "\n".join(lines)
+
+    def show_ipv6_neighbors(self):
+        lines = ["IPv6 Address                              Age Link-layer Addr State Interface"]
+        for ipv6, mac in self.neighbors:
+            lines.append(f"{ipv6:<41} 0 {mac:<15} REACH Fa0/0")
+        return "\n".join(lines)
+
+    def configure(self, header, line):
+        """Apply one config line, header is the current sub-mode section or None."""
+        with self._lock:
+            if header is None:
+                if line.startswith("no "):
+                    self.running_config.pop(line[3:], None)
+                    self._bound_at.pop(line[3:], None)
+                else:
+                    self.running_config.setdefault(line, [])
+            else:
+                children = self.running_config.setdefault(header, [])
+                if line.startswith("no ") and line[3:] in children:
+                    children.remove(line[3:])
+                elif line not in children:
+                    children.append(line)
+                if header.startswith("ip dhcp pool "):
+                    self._bound_at[header] = time.monotonic()
+
+    def execute(self, command, mode, section):
+        """Run one cli line, returns (output, mode, section). mode is exec, config or a sub-mode."""
+        if mode == "exec":
+            if not command:
+                return "", mode, section
+            if command.startswith("terminal ") or command == "show clock":
+                return "", mode, section
+            if command.startswith("show run"):
+                return self.show_running_config(), mode, section
+            if command.startswith("show ip dhcp binding"):
+                return self.show_dhcp_binding(), mode, section
+            if command.startswith("show ipv6 neighbors"):
+                return self.show_ipv6_neighbors(), mode, section
+            if command.startswith("conf"):
+                return "Enter configuration commands, one per line.  End with CNTL/Z.", "config", None
+            return "% Invalid input detected at '^' marker.", mode, section
+
+        if command == "end":
+            return "", "exec", None
+        if command == "exit":
+            return ("", "config", None) if mode != "config" else ("", "exec", None)
+        if not command:
+            return "", mode, section
+        if section is not None and not command.startswith(IOS_GLOBAL_PREFIXES):
+            self.configure(section, command)
+            return "", mode, section
+
+        # a global line, it opens a sub-mode when it names a section
+        self.configure(None, command)
+        submode = next((m for k, m in IOS_SUBMODES.items() if command.startswith(k)), None)
+        if submode:
+            return "", submode, command
+        return "", "config", None
+
+    def prompt(self, mode):
+        return f"{self.hostname}#" if mode == "exec" else f"{self.hostname}({mode})#"
+
+    # ssh plumbing
+    def _serve_shell(self, channel):
+        mode, section = "exec", None
+        channel.sendall(f"\r\n{self.prompt(mode)}".encode())
+        line, previous = bytearray(), None
+        while True:
+            data = channel.recv(4096)
+            if not data:
+                return
+            for byte in data:
+                if byte not in (10, 13):
+                    line.append(byte)
+                elif not (byte == 10 and previous == 13):  # \r\n ends one line, not two
+                    command, line = line.decode("utf8", "replace").strip(), bytearray()
+                    if mode == "exec" and command in ("exit", "logout", "quit"):
+                        channel.close()
+                        return
+                    if self.latency:
+                        time.sleep(self.latency)
+                    self.commands += 1
+                    output, mode, section = self.execute(command, mode, section)
+                    # ios echoes the command, then the output and the prompt of the new mode
+                    reply = command + "\r\n"
+                    if output:
+                        reply += output.replace("\n", "\r\n") + "\r\n"
+                    channel.sendall((reply + self.prompt(mode)).encode())
+                previous = byte
+
+    def _handle(self, client):
+        import paramiko
+
+        server = self
+
+        class Interface(paramiko.ServerInterface):
+            def __init__(self):
+                self.shell = threading.Event()
+
+            def check_auth_password(self, username, password):
+                if (username, password) == (server.username, server.password):
+                    return paramiko.AUTH_SUCCESSFUL
+                return paramiko.AUTH_FAILED
+
+            def get_allowed_auths(self, username):
+                return "password"
+
+            def check_channel_request(self, kind, chanid):
+                return paramiko.OPEN_SUCCEEDED if kind == "session" else paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+            def check_channel_pty_request(self, *args):
+                return True
+
+            def check_channel_shell_request(self, channel):
+                self.shell.set()
+                return True
+
+        transport = paramiko.Transport(client)
+        transport.add_server_key(self._host_key)
+        interface = Interface()
+        try:
+            transport.start_server(server=interface)
+            channel = transport.accept(10)
+            if channel is not None and interface.shell.wait(10):
+                self._serve_shell(channel)
+        except (EOFError, OSError, paramiko.SSHException):
+            pass
+        finally:
+            transport.close()
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self._sock.accept()
+            except OSError:
+                return  # socket closed by stop()
+            threading.Thread(target=self._handle, args=(client,), daemon=True).start()
+
+    def start(self):
+        import paramiko
+
+        self._host_key = paramiko.RSAKey.generate(2048)
+        family = socket.AF_INET6 if ":" in self.host else socket.AF_INET
+        self._sock = socket.socket(family, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((self.host, self.port))
+        self._sock.listen(64)
+        self.port = self._sock.getsockname()[1]
+        self._thread = threading.Thread(target=self._accept, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,130 @@
+#/usr/bin/env python3
+import bisect
+import json
+import os
+import time
+
+# append-only snmp snapshot store
+# every poll appends one json line per router that changed, holding only the fields that
+# differ from its previous record; every KEYFRAME_INTERVAL records a router gets a full copy.
+# a sidecar index (router, timestamp, byte offset, keyframe) makes point-in-time rebuilds
+# seek straight to the nearest keyframe instead of replaying the whole file
+
+SNAPSHOT_FILE = "snmp_snapshots.jsonl"
+KEYFRAME_INTERVAL = 50
+
+
+#fields of new that differ from old, interface_status is diffed per interface (None = removed)
+def snmp_delta(old, new):
+    delta = {}
+    for field, value in new.items():
+        if field == "interface_status" and isinstance(old.get(field), dict):
+            changes = {k: v for k, v in value.items() if old[field].get(k) != v}
+            changes.update({k: None for k in old[field] if k not in value})
+            if changes:
+                delta[field] = changes
+        elif old.get(field) != value:
+            delta[field] = value
+    return delta
+
+#apply a delta produced by snmp_delta
+def apply_delta(state, delta):
+    state = dict(state)
+    for field, value in delta.items():
+        if field == "interface_status" and isinstance(state.get(field), dict):
+            status = dict(state[field])
+            for k, v in value.items():
+                if v is None:
+                    status.pop(k, None)
+                else:
+                    status[k] = v
+            state[field] = status
+        else:
+            state[field] = value
+    return state
+
+
+class SnapshotStore:
+    def __init__(self, path=SNAPSHOT_FILE, keyframe_interval=KEYFRAME_INTERVAL):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.keyframe_interval = keyframe_interval
+        self.index = {}  # router -> {"ts": [...], "offset": [...], "full": [...]}
+        self.latest = {}  # router -> last stored state
+        self._since_keyframe = {}
+        self._load_index()
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, "r", encoding="utf8") as file:
+            for line in file:
+                entry = json.loads(line)
+                self._add_index(entry["router"], entry["ts"], entry["offset"], entry["full"])
+        # current state per router, rebuilt from its last keyframe
+        for router in self.index:
+            self.latest[router] = self.router_at(router, float("inf"))
+
+    def _add_index(self, router, ts, offset, full):
+        entries = self.index.setdefault(router, {"ts": [], "offset": [], "full": []})
+        entries["ts"].append(ts)
+        entries["offset"].append(offset)
+        entries["full"].append(full)
+        self._since_keyframe[router] = 0 if full else self._since_keyframe.get(router, 0) + 1
+
+    def append(self, snmp_data, ts=None):
+        """Store the routers of snmp_data that changed since their last record.
+        Returns the number of records written."""
+        ts = time.time() if ts is None else ts
+        written = 0
+        with open(self.path, "ab") as data_file, open(self.index_path, "a", encoding="utf8") as index_file:
+            for router, state in snmp_data.items():
+                previous = self.latest.get(router)
+                full = previous is None or self._since_keyframe.get(router, 0) + 1 >= self.keyframe_interval
+                delta = state if full else snmp_delta(previous, state)
+                if not delta and not full:
+                    continue  # unchanged since the last poll
+
+                offset = data_file.tell()
+                record = {"router": router, "ts": ts, "full": full, "data": delta}
+                data_file.write((json.dumps(record, separators=(",", ":")) + "\n").encode("utf8"))
+                index_file.write(json.dumps({"router": router, "ts": ts, "offset": offset, "full": full}) + "\n")
+                self._add_index(router, ts, offset, full)
+                self.latest[router] = state
+                written += 1
+        return written
+
+    def router_at(self, router, ts):
+        """State of one router as of ts, None if it had no record yet."""
+        entries = self.index.get(router)
+        if not entries:
+            return None
+        end = bisect.bisect_right(entries["ts"], ts)
+        if end == 0:
+            return None
+        start = end - 1
+        while not entries["full"][start]:
+            start -= 1
+
+        state = {}
+        with open(self.path, "rb") as file:
+            for offset in entries["offset"][start:end]:
+                file.seek(offset)
+                record = json.loads(file.readline())
+                state = record["data"] if record["full"] else apply_delta(state, record["data"])
+        return state
+
+    def snapshot_at(self, ts=None):
+        """snmp_data as it was at ts (latest when None), in the shape fetch_snmp_data returns."""
+        if ts is None:
+            return dict(self.latest)
+        snapshot = {}
+        for router in self.index:
+            state = self.router_at(router, ts)
+            if state is not None:
+                snapshot[router] = state
+        return snapshot
+
+    def history(self, router):
+        """Timestamps at which a router changed."""
+        return list(self.index.get(router, {}).get("ts", []))
@@ -1,16 +1,44 @@
 #/usr/bin/env python3
 import csv
 import json
+import socket
 import time
-from easysnmp import Session
-from ipaddress import IPv6Address
-from prettytable import PrettyTable
-import matplotlib.pyplot as plt
+import threading
+import warnings
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from NMsnapshot import SnapshotStore
+from NMifstate import InterfaceStateTracker, display_interface_events
+from NMmetrics import METRICS
+
+# easysnmp, prettytable and the chart code are imported where they are used,
+# so importing this module for one function stays cheap
 
 # snmp configuration
 SNMP_COMMUNITY = "midterm"
 SNMP_PORT = 161
 
+# oids walked for every router and default number of routers polled in parallel
+SNMP_DATA_OIDS = ("OID_IF_IPV4", "OID_IF_IPV6", "OID_IF_STATUS", "OID_CPU_UTILIZATION")
+SNMP_MAX_WORKERS = 32
+
+# session pool limits: idle sessions older than this are closed, and at most
+# this many idle sessions are kept across all hosts
+SNMP_SESSION_IDLE_TIMEOUT = 300
+SNMP_SESSION_POOL_SIZE = 256
+
+# rows requested per column in each GETBULK pdu
+SNMP_MAX_REPETITIONS = 25
+
+# getbulk types that mark the end of a column
+SNMP_END_OF_COLUMN = ("ENDOFMIBVIEW", "NOSUCHOBJECT", "NOSUCHINSTANCE")
+
+# ipAddressIfIndex (IP-MIB), indexed by address type, address length and the address octets
+OID_IP_ADDRESS_IFINDEX = "1.3.6.1.2.1.4.34.1.3"
+# InetAddressType values of ipv6 rows, ipv6z (4) has a 4 octet zone index after the address
+INET_ADDRESS_TYPES_IPV6 = ("2", "4")
+
 # load router IPs from csv
 def load_router_ips(file_path):
     routers = {}
@@ -31,65 +59,263 @@ def load_oids(file_path):
                 oids[row[0].strip()] = row[1].strip()
     return oids
 
+# pool of easysnmp sessions keyed by (host, community, version)
+# a session is handed to one caller at a time and returned to the pool afterwards,
+# so concurrent walks against the same router each get their own session
+class SessionPool:
+    def __init__(self, idle_timeout=SNMP_SESSION_IDLE_TIMEOUT, max_size=SNMP_SESSION_POOL_SIZE,
+                 timeout=3, retries=2):
+        self.idle_timeout = idle_timeout
+        self.max_size = max_size
+        self.timeout = timeout
+        self.retries = retries
+        self._idle = OrderedDict()  # (key, id(session)) -> (session, last used time)
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        # drop sessions idle for too long, then the least recently used over the size limit
+        while self._idle:
+            entry_key, (session, last_used) = next(iter(self._idle.items()))
+            if now - last_used <= self.idle_timeout and len(self._idle) <= self.max_size:
+                break
+            del self._idle[entry_key]
+
+    def acquire(self, host, community=SNMP_COMMUNITY, version=2):
+        key = (host, community, version)
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            # reuse the most recently returned session for this key
+            for entry_key in reversed(self._idle):
+                if entry_key[0] == key:
+                    session, _ = self._idle.pop(entry_key)
+                    return session
+        from easysnmp import Session
+
+        # numeric oids keep table indexes intact and let getbulk results be matched to columns
+        return Session(hostname=host, community=community, version=version,
+                       timeout=self.timeout, retries=self.retries, use_numeric=True)
+
+    def release(self, session, host, community=SNMP_COMMUNITY, version=2):
+        key = (host, community, version)
+        with self._lock:
+            self._idle[(key, id(session))] = (session, time.monotonic())
+            self._evict(time.monotonic())
+
+    @contextmanager
+    def session(self, host, community=SNMP_COMMUNITY, version=2):
+        session = self.acquire(host, community, version)
+        yield session
+        # only reached when the caller did not raise, a failed session is dropped
+        self.release(session, host, community, version)
+
+    def clear(self):
+        with self._lock:
+            self._idle.clear()
+
+    def __len__(self):
+        return len(self._idle)
+
+SESSION_POOL = SessionPool()
+
+# full numeric oid of a varbind, easysnmp splits the last sub-identifier into oid_index
+def varbind_oid(item):
+    oid = item.oid.lstrip(".")
+    return f"{oid}.{item.oid_index}" if item.oid_index else oid
+
 # snmp walk request
-def snmp_walk(ip, oid):
+def snmp_walk(ip, oid, pool=SESSION_POOL):
     result = {}
     try:
-        session = Session(hostname=ip, community=SNMP_COMMUNITY, version=2, timeout=3, retries=2)
-        walk_results = session.walk(oid)
+        with METRICS.timer("snmp_walk_seconds", op="walk"), pool.session(ip) as session:
+            walk_results = session.walk(oid)
         for item in walk_results:
-            result[item.oid] = item.value
+            result[varbind_oid(item)] = item.value
     except Exception as e:
         print(f"snmp walk error on {ip}: {str(e)}")
+    METRICS.incr("snmp_varbinds_total", len(result), op="walk")
+    return result
+
+# walk several table columns with GETBULK, all columns share one pdu per round-trip
+# returns {column oid: {oid: value}}, columns collected before an error are kept
+def snmp_bulk_walk(ip, columns, max_repetitions=SNMP_MAX_REPETITIONS, pool=SESSION_POOL):
+    columns = [column.lstrip(".") for column in columns]
+    result = {column: {} for column in columns}
+    next_oid = {column: column for column in columns}  # last oid seen per unfinished column
+
+    try:
+        with METRICS.timer("snmp_walk_seconds", op="bulk"), pool.session(ip) as session:
+            while next_oid:
+                requested = list(next_oid)
+                with METRICS.timer("snmp_request_seconds", op="getbulk"):
+                    varbinds = session.get_bulk([next_oid[column] for column in requested],
+                                                non_repeaters=0, max_repetitions=max_repetitions)
+                if not varbinds:
+                    break
+
+                # varbinds come back row by row, one per requested column
+                finished = set()
+                for i, item in enumerate(varbinds):
+                    column = requested[i % len(requested)]
+                    if column in finished:
+                        continue
+                    oid = varbind_oid(item)
+                    if item.snmp_type in SNMP_END_OF_COLUMN or not oid.startswith(column + ".") \
+                            or oid in result[column]:
+                        finished.add(column)
+                        continue
+                    result[column][oid] = item.value
+                    next_oid[column] = oid
+
+                for column in finished:
+                    del next_oid[column]
+    except Exception as e:
+        print(f"snmp bulk walk error on {ip}: {str(e)}")
+    METRICS.incr("snmp_varbinds_total", sum(map(len, result.values())), op="bulk")
     return result
 
-# convert raw snmp IPv6 OID output into readable IPv6 address
-def format_ipv6_address(raw_oid):
+# octet sub-identifiers of the ipv6 address in an ipAddressTable index (type.length.octets),
+# None for ipv4 and other types. some agents leave the length out
+def ipv6_index_octets(index):
+    addr_type, _, rest = index.partition(".")
+    if addr_type not in INET_ADDRESS_TYPES_IPV6:
+        return None
+    parts = rest.split(".")
+    if parts[0].isdigit() and len(parts) == int(parts[0]) + 1:
+        parts = parts[1:]
+    return parts[:16] if len(parts) >= 16 else None
+
+# dotted sub-identifiers to bytes with numpy's text parser, None unless the text holds
+# exactly count values that all fit in an octet
+def parse_octets(text, count):
+    import numpy as np
+
+    if not count:
+        return b""
     try:
-        parts = raw_oid.split(".")[-16:]  # Extract last 16 values (IPv6 parts)
-        ipv6 = IPv6Address(bytes(int(x) for x in parts))
-        return str(ipv6)
-    except Exception:
+        with warnings.catch_warnings():
+            # text it cannot parse to the end is a warning or an error depending on numpy
+            warnings.simplefilter("ignore", DeprecationWarning)
+            values = np.fromstring(text, dtype=np.int64, sep=".")
+    except ValueError:
+        return None
+    if values.size != count or values.min() < 0 or values.max() > 255:
         return None
+    return values.astype(np.uint8).tobytes()
+
+# decode an ipAddressIfIndex walk ({oid: ifindex}) into {ifindex: [ipv6, ...]} in walk order
+# plain ipv6 rows (type 2, length 16) are recognised by string prefix, the octets of all of them
+# are parsed in one pass and formatted with inet_ntop. other index forms go through
+# ipv6_index_octets, rows outside column fall back to the last 16 sub-identifiers
+def decode_ipv6_addresses(raw, column=OID_IP_ADDRESS_IFINDEX):
+    prefix = column.strip(".") + "."
+    plain = prefix + "2.16."
+    skip = len(plain)
+    ifindexes, tails = [], []
+    for oid, ifindex in raw.items():
+        if oid.startswith(plain) and oid.count(".", skip) == 15:
+            tail = oid[skip:]
+        else:
+            oid = oid.lstrip(".")
+            parts = ipv6_index_octets(oid[len(prefix):]) if oid.startswith(prefix) else oid.split(".")[-16:]
+            if not parts or len(parts) != 16:
+                continue
+            tail = ".".join(parts)
+        ifindexes.append(ifindex)
+        tails.append(tail)
+
+    packed = parse_octets(".".join(tails), 16 * len(tails))
+    if packed is None:
+        # a sub-identifier that is not an octet somewhere, drop just the rows that have one
+        valid = [i for i, tail in enumerate(tails) if all(p.isdigit() and int(p) < 256 for p in tail.split("."))]
+        ifindexes = [ifindexes[i] for i in valid]
+        packed = bytes(int(p) for i in valid for p in tails[i].split("."))
+
+    addresses = {}
+    for i, ifindex in enumerate(ifindexes):
+        addresses.setdefault(ifindex, []).append(socket.inet_ntop(socket.AF_INET6, packed[i * 16:i * 16 + 16]))
+    return addresses
+
+# walk every snmp oid of one router
+# bulk uses one GETBULK stream for all oids, otherwise oids are walked one by one,
+# concurrently when walk_workers > 1
+def walk_router_oids(ip, oids, walk_workers=1, bulk=True, max_repetitions=SNMP_MAX_REPETITIONS):
+    if bulk:
+        columns = snmp_bulk_walk(ip, oids.values(), max_repetitions)
+        return {name: columns[oid.lstrip(".")] for name, oid in oids.items()}
+    if walk_workers <= 1:
+        return {name: snmp_walk(ip, oid) for name, oid in oids.items()}
+    with ThreadPoolExecutor(max_workers=walk_workers) as executor:
+        futures = {name: executor.submit(snmp_walk, ip, oid) for name, oid in oids.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+# build the per-router snmp_data entry from raw walk results
+def build_router_data(ipv4_raw, ipv6_raw, status_raw, cpu_raw):
+    ipv4_addresses = list(ipv4_raw.values())
+
+    # convert ipv6 to readable format and take only the first address per interface
+    ipv6_addresses = {ifindex: addresses[0] for ifindex, addresses in decode_ipv6_addresses(ipv6_raw).items()}
+
+    # convert interface status (1=up, 2=down)
+    interface_status = {k.split(".")[-1]: "up" if v == "1" else "down" for k, v in status_raw.items()}
+
+    # validate cpu data using snmpwalk results
+    cpu_utilization = "N/A"
+    if cpu_raw:
+        # Try to extract the last value from the snmpwalk result
+        try:
+            cpu_utilization = [value for value in cpu_raw.values()][-1]  # Last value in the list
+            cpu_utilization = f"{cpu_utilization}%" if cpu_utilization.isdigit() else "N/A"
+        except Exception as e:
+            cpu_utilization = "N/A"
+
+    return {
+        "ipv4_addresses": ipv4_addresses,
+        "ipv6_addresses": list(ipv6_addresses.values()),  # Only first IPv6 address per interface
+        "interface_status": interface_status,
+        "cpu_utilization": cpu_utilization
+    }
+
+# fetch snmp data from one router
+def fetch_router_snmp_data(router, ip, oids, walk_workers=1, bulk=True,
+                           max_repetitions=SNMP_MAX_REPETITIONS):
+    print(f"\ngetting snmp data from {router} ({ip})...")
+    wanted = {name: oids[name] for name in SNMP_DATA_OIDS}
+    raw = walk_router_oids(ip, wanted, walk_workers, bulk, max_repetitions)
+    return build_router_data(raw["OID_IF_IPV4"], raw["OID_IF_IPV6"], raw["OID_IF_STATUS"], raw["OID_CPU_UTILIZATION"])
 
 # fetch snmp data from all routers
-def fetch_snmp_data(router_ips, oids):
+def fetch_snmp_data(router_ips, oids, bulk=True, max_repetitions=SNMP_MAX_REPETITIONS):
     snmp_data = {}
 
     for router, ip in router_ips.items():
-        print(f"\ngetting snmp data from {router} ({ip})...")
-
-        ipv4_addresses = list(snmp_walk(ip, oids["OID_IF_IPV4"]).values())
-        raw_ipv6_addresses = snmp_walk(ip, oids["OID_IF_IPV6"])
-        raw_interface_status = snmp_walk(ip, oids["OID_IF_STATUS"])
-        cpu_utilization_raw = snmp_walk(ip, oids["OID_CPU_UTILIZATION"])
-
-        # convert ipv6 to readable format and take only the first address per interface
-        ipv6_addresses = {}
-        for oid, value in raw_ipv6_addresses.items():
-            ipv6_addr = format_ipv6_address(oid)
-            if ipv6_addr and value not in ipv6_addresses:
-                ipv6_addresses[value] = ipv6_addr
-
-        # convert interface status (1=up, 2=down)
-        interface_status = {k.split(".")[-1]: "up" if v == "1" else "down" for k, v in raw_interface_status.items()}
-
-        # validate cpu data using snmpwalk results
-        cpu_utilization = "N/A"
-        if cpu_utilization_raw:
-            # Try to extract the last value from the snmpwalk result
-            try:
-                cpu_utilization = [value for value in cpu_utilization_raw.values()][-1]  # Last value in the list
-                cpu_utilization = f"{cpu_utilization}%" if cpu_utilization.isdigit() else "N/A"
-            except Exception as e:
-                cpu_utilization = "N/A"
+        snmp_data[router] = fetch_router_snmp_data(router, ip, oids, bulk=bulk,
+                                                   max_repetitions=max_repetitions)
+
+    return snmp_data
 
-        snmp_data[router] = {
-            "ipv4_addresses": ipv4_addresses,
-            "ipv6_addresses": list(ipv6_addresses.values()),  # Only first IPv6 address per interface
-            "interface_status": interface_status,
-            "cpu_utilization": cpu_utilization
+# fetch snmp data from all routers in parallel
+# max_workers limits how many routers are polled at once, walk_workers how many
+# oids are walked at once per router when bulk is off; use_processes swaps threads for processes
+def fetch_snmp_data_concurrent(router_ips, oids, max_workers=SNMP_MAX_WORKERS,
+                               walk_workers=len(SNMP_DATA_OIDS), use_processes=False,
+                               bulk=True, max_repetitions=SNMP_MAX_REPETITIONS):
+    pool_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    snmp_data = {}
+
+    with pool_class(max_workers=max_workers) as executor:
+        futures = {
+            router: executor.submit(fetch_router_snmp_data, router, ip, oids, walk_workers,
+                                    bulk, max_repetitions)
+            for router, ip in router_ips.items()
         }
+        # keep the router order of router_ips so output matches fetch_snmp_data
+        for router, future in futures.items():
+            try:
+                snmp_data[router] = future.result()
+            except Exception as e:
+                print(f"snmp collection failed for {router}: {str(e)}")
+                snmp_data[router] = build_router_data({}, {}, {}, {})
 
     return snmp_data
 
@@ -101,6 +327,8 @@ def save_snmp_data(snmp_data, filename="snmp_data.txt"):
 
 #snmp data in table
 def display_snmp_data(snmp_data):
+    from prettytable import PrettyTable
+
     table = PrettyTable(["Router", "IPv4 Addresses", "IPv6 Addresses", "Interfaces", "CPU Utilization"])
     
     for router, data in snmp_data.items():
@@ -142,14 +370,9 @@ def monitor_cpu(router_ip, oid, duration=60, interval=10):
         cpu_data = [0] * int(duration / interval)  # Create a list of zeros for the entire duration
         timestamps = [i * interval for i in range(len(cpu_data))]  # Create timestamps for the duration
 
-    # Plot and save the CPU utilization graph
-    plt.figure(figsize=(8, 4))
-    plt.plot(timestamps, cpu_data, marker="o", linestyle="-", color="b")
-    plt.xlabel("Time (seconds)")
-    plt.ylabel("CPU Utilization (%)")
-    plt.title("CPU Utilization of R1 Over Time")
-    plt.grid()
-    plt.savefig("cpu_utilization.jpg")
+    # Plot and save the CPU utilization graph, long runs are downsampled before drawing
+    from NMcharts import render_cpu_chart
+    render_cpu_chart(timestamps, cpu_data, "cpu_utilization.jpg", title="CPU Utilization of R1 Over Time")
     print("\ncpu utilization graph saved to cpu_utilization.jpg")
 
 
@@ -158,10 +381,16 @@ if __name__ == "__main__":
     router_ips = load_router_ips("snmp_routers.csv")
     oids = load_oids("oid_commands.csv")
 
-    snmp_data = fetch_snmp_data(router_ips, oids)
+    snmp_data = fetch_snmp_data_concurrent(router_ips, oids)
 
-    # save to json file
+    # save to json file and append the changes to the snapshot history
     save_snmp_data(snmp_data)
+    SnapshotStore().append(snmp_data)
+
+    # report interfaces that went up or down since the last run
+    tracker = InterfaceStateTracker.load()
+    display_interface_events(tracker.update_snmp_data(snmp_data))
+    tracker.save()
 
     # display formatted output
     display_snmp_data(snmp_data)
@@ -0,0 +1,361 @@
+#/usr/bin/env python3
+import asyncio
+import itertools
+import socket
+import time
+from NMmetrics import METRICS
+from NMsnmp import (SNMP_COMMUNITY, SNMP_PORT, SNMP_DATA_OIDS, SNMP_MAX_REPETITIONS, SNMP_END_OF_COLUMN,
+                    load_router_ips, load_oids, build_router_data, display_snmp_data, save_snmp_data)
+
+# asyncio snmp v2c polling
+# one udp socket per address family carries every request, replies are matched by
+# request-id, so thousands of requests can be in flight on a single event loop
+
+# hard deadline per device and default limit of requests in flight
+SNMP_DEVICE_DEADLINE = 10
+SNMP_ASYNC_MAX_IN_FLIGHT = 2000
+
+# ber tags
+TAG_INTEGER = 0x02
+TAG_OCTET_STRING = 0x04
+TAG_NULL = 0x05
+TAG_OID = 0x06
+TAG_SEQUENCE = 0x30
+TAG_GET = 0xA0
+TAG_GETNEXT = 0xA1
+TAG_RESPONSE = 0xA2
+TAG_GETBULK = 0xA5
+
+# value tags mapped to the snmp_type names easysnmp uses
+SNMP_TYPES = {
+    0x02: "INTEGER",
+    0x04: "OCTETSTR",
+    0x05: "NULL",
+    0x06: "OBJECTID",
+    0x40: "IPADDR",
+    0x41: "COUNTER",
+    0x42: "GAUGE",
+    0x43: "TICKS",
+    0x44: "OPAQUE",
+    0x46: "COUNTER64",
+    0x80: "NOSUCHOBJECT",
+    0x81: "NOSUCHINSTANCE",
+    0x82: "ENDOFMIBVIEW",
+}
+
+
+class SnmpError(Exception):
+    """Raised when an agent answers with a non-zero error-status."""
+
+
+# ber encoding
+def encode_length(length):
+    if length < 0x80:
+        return bytes([length])
+    raw = length.to_bytes((length.bit_length() + 7) // 8, "big")
+    return bytes([0x80 | len(raw)]) + raw
+
+def encode_tlv(tag, value):
+    return bytes([tag]) + encode_length(len(value)) + value
+
+def encode_integer(value, tag=TAG_INTEGER):
+    size = max(1, (value.bit_length() + 8) // 8)
+    return encode_tlv(tag, value.to_bytes(size, "big", signed=True))
+
+def encode_oid(oid):
+    parts = [int(x) for x in oid.strip(".").split(".")]
+    body = bytearray([parts[0] * 40 + parts[1]])
+    for part in parts[2:]:
+        chunk = [part & 0x7F]
+        part >>= 7
+        while part:
+            chunk.append(0x80 | (part & 0x7F))
+            part >>= 7
+        body.extend(reversed(chunk))
+    return encode_tlv(TAG_OID, bytes(body))
+
+def encode_message(pdu_type, request_id, oids, community=SNMP_COMMUNITY, error_status=0,
+                   error_index=0, values=None):
+    """Encode a v2c message. For GETBULK error_status/error_index carry
+    non-repeaters/max-repetitions. values is a list of (tag, raw bytes) for responses."""
+    varbinds = b""
+    for i, oid in enumerate(oids):
+        value = encode_tlv(*values[i]) if values else encode_tlv(TAG_NULL, b"")
+        varbinds += encode_tlv(TAG_SEQUENCE, encode_oid(oid) + value)
+    pdu = (encode_integer(request_id) + encode_integer(error_status) + encode_integer(error_index)
+           + encode_tlv(TAG_SEQUENCE, varbinds))
+    message = (encode_integer(1) + encode_tlv(TAG_OCTET_STRING, community.encode())
+               + encode_tlv(pdu_type, pdu))
+    return encode_tlv(TAG_SEQUENCE, message)
+
+
+# ber decoding
+def decode_tlv(data, pos):
+    """Return (tag, value start, value end) of the tlv at pos."""
+    tag = data[pos]
+    length = data[pos + 1]
+    pos += 2
+    if length & 0x80:
+        size = length & 0x7F
+        length = int.from_bytes(data[pos:pos + size], "big")
+        pos += size
+    return tag, pos, pos + length
+
+def decode_oid(raw):
+    first = raw[0]
+    parts = [first // 40, first % 40] if first < 80 else [2, first - 80]
+    value = 0
+    for byte in raw[1:]:
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            parts.append(value)
+            value = 0
+    return ".".join(str(x) for x in parts)
+
+def decode_value(tag, raw):
+    if tag == TAG_INTEGER:
+        return str(int.from_bytes(raw, "big", signed=True))
+    if tag in (0x41, 0x42, 0x43, 0x46):
+        return str(int.from_bytes(raw, "big"))
+    if tag == TAG_OID:
+        return decode_oid(raw)
+    if tag == 0x40:
+        return ".".join(str(x) for x in raw)
+    if tag in (TAG_OCTET_STRING, 0x44):
+        return raw.decode("latin-1")
+    return ""
+
+def decode_message(data):
+    """Decode a v2c message into (pdu type, request-id, error-status, error-index, varbinds, community).
+    varbinds is a list of (oid, snmp_type, value)."""
+    _, pos, _ = decode_tlv(data, 0)
+    _, start, pos = decode_tlv(data, pos)  # version
+    _, start, end = decode_tlv(data, pos)  # community
+    community = bytes(data[start:end]).decode("latin-1")
+    pdu_type, pos, _ = decode_tlv(data, end)
+
+    fields = []
+    for _ in range(3):
+        _, start, pos = decode_tlv(data, pos)
+        fields.append(int.from_bytes(data[start:pos], "big", signed=True))
+
+    varbinds = []
+    _, pos, list_end = decode_tlv(data, pos)
+    while pos < list_end:
+        _, start, pos = decode_tlv(data, pos)
+        _, oid_start, oid_end = decode_tlv(data, start)
+        tag, value_start, value_end = decode_tlv(data, oid_end)
+        raw = bytes(data[value_start:value_end])
+        varbinds.append((decode_oid(bytes(data[oid_start:oid_end])), SNMP_TYPES.get(tag, "UNKNOWN"),
+                         decode_value(tag, raw)))
+    return pdu_type, fields[0], fields[1], fields[2], varbinds, community
+
+
+class _SnmpProtocol(asyncio.DatagramProtocol):
+    def __init__(self, pending):
+        self.pending = pending
+
+    def datagram_received(self, data, addr):
+        try:
+            pdu_type, request_id, error_status, error_index, varbinds, _ = decode_message(data)
+        except (IndexError, ValueError):
+            return  # not an snmp reply we can read
+        future = self.pending.get(request_id)
+        if future is None or future.done() or pdu_type != TAG_RESPONSE:
+            return
+        if error_status:
+            future.set_exception(SnmpError(f"error-status {error_status} at index {error_index}"))
+        else:
+            future.set_result(varbinds)
+
+
+class AsyncSnmpClient:
+    """SNMP v2c client multiplexing every request over one socket per address family."""
+
+    def __init__(self, community=SNMP_COMMUNITY, port=SNMP_PORT, timeout=3, retries=2,
+                 max_in_flight=SNMP_ASYNC_MAX_IN_FLIGHT):
+        self.community = community
+        self.port = port
+        self.timeout = timeout
+        self.retries = retries
+        self._pending = {}
+        self._transports = {}
+        self._request_ids = itertools.count(1)
+        self._slots = asyncio.Semaphore(max_in_flight)
+
+    async def _transport(self, host):
+        family = socket.AF_INET6 if ":" in host else socket.AF_INET
+        if family not in self._transports:
+            loop = asyncio.get_running_loop()
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: _SnmpProtocol(self._pending), family=family)
+            self._transports[family] = transport
+        return self._transports[family]
+
+    async def request(self, host, pdu_type, oids, non_repeaters=0, max_repetitions=0):
+        """Send one pdu and return its varbinds, raising TimeoutError once retries run out."""
+        transport = await self._transport(host)
+        request_id = next(self._request_ids) % 0x7FFFFFFF
+        message = encode_message(pdu_type, request_id, oids, self.community,
+                                 non_repeaters, max_repetitions)
+        async with self._slots:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[request_id] = future
+            try:
+                start = time.perf_counter()
+                for attempt in range(self.retries + 1):
+                    transport.sendto(message, (host, self.port))
+                    try:
+                        varbinds = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+                        METRICS.observe("snmp_request_seconds", time.perf_counter() - start, op="async")
+                        return varbinds
+                    except asyncio.TimeoutError:
+                        METRICS.incr("snmp_timeouts_total", op="async")
+                        continue
+                raise TimeoutError(f"no response from {host} after {self.retries + 1} tries")
+            finally:
+                self._pending.pop(request_id, None)
+                if not future.done():
+                    future.cancel()
+
+    async def bulk_walk(self, host, column, rows, max_repetitions=SNMP_MAX_REPETITIONS):
+        """Walk one table column into rows ({oid: value}) as replies arrive, so a
+        cancelled walk still leaves the rows collected so far."""
+        column = column.strip(".")
+        next_oid = column
+        while True:
+            varbinds = await self.request(host, TAG_GETBULK, [next_oid], 0, max_repetitions)
+            if not varbinds:
+                return rows
+            for oid, snmp_type, value in varbinds:
+                if snmp_type in SNMP_END_OF_COLUMN or not oid.startswith(column + ".") or oid in rows:
+                    return rows
+                rows[oid] = value
+                next_oid = oid
+
+    def close(self):
+        for transport in self._transports.values():
+            transport.close()
+        self._transports.clear()
+
+
+# classify why a column walk did not finish
+def walk_error(task):
+    if task.cancelled():
+        return "deadline exceeded"
+    error = task.exception()
+    if error is None:
+        return None
+    if isinstance(error, TimeoutError):
+        return "timeout"
+    return str(error) or type(error).__name__
+
+# walk the snmp_data oids of one router within a hard deadline
+# returns (router data, report), a device that misses its deadline keeps the rows walked so far
+async def fetch_router_snmp_data_async(client, router, ip, oids, deadline=SNMP_DEVICE_DEADLINE,
+                                       max_repetitions=SNMP_MAX_REPETITIONS):
+    start = time.monotonic()
+    raw = {name: {} for name in SNMP_DATA_OIDS}
+    tasks = {name: asyncio.ensure_future(client.bulk_walk(ip, oids[name], raw[name], max_repetitions))
+             for name in SNMP_DATA_OIDS}
+
+    _, pending = await asyncio.wait(tasks.values(), timeout=deadline)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+    errors = {}
+    for name, task in tasks.items():
+        error = walk_error(task)
+        if error:
+            errors[name] = {"oid": oids[name], "error": error}
+
+    data = build_router_data(raw["OID_IF_IPV4"], raw["OID_IF_IPV6"], raw["OID_IF_STATUS"],
+                             raw["OID_CPU_UTILIZATION"])
+    report = {
+        "ip": ip,
+        "elapsed": round(time.monotonic() - start, 3),
+        "partial": bool(errors),
+        "errors": errors,
+    }
+    return data, report
+
+# fetch snmp data from all routers on one event loop
+# returns (snmp_data, report) where report lists elapsed time and per-oid errors by router
+async def fetch_snmp_data_async(router_ips, oids, deadline=SNMP_DEVICE_DEADLINE,
+                                max_repetitions=SNMP_MAX_REPETITIONS,
+                                max_in_flight=SNMP_ASYNC_MAX_IN_FLIGHT, timeout=3, retries=2,
+                                port=SNMP_PORT):
+    client = AsyncSnmpClient(port=port, timeout=timeout, retries=retries, max_in_flight=max_in_flight)
+    try:
+        results = await asyncio.gather(*(
+            fetch_router_snmp_data_async(client, router, ip, oids, deadline, max_repetitions)
+            for router, ip in router_ips.items()
+        ))
+    finally:
+        client.close()
+
+    snmp_data, report = {}, {}
+    for router, (data, router_report) in zip(router_ips, results):
+        snmp_data[router] = data
+        report[router] = router_report
+    return snmp_data, report
+
+# print devices that came back partial, slowest first
+def display_snmp_report(report):
+    slow = sorted((r for r in report.items() if r[1]["partial"]), key=lambda r: -r[1]["elapsed"])
+    if not slow:
+        print("\nall devices answered within their deadline")
+        return
+    print("\ndevices with partial results:")
+    for router, router_report in slow:
+        errors = ", ".join(f"{name}: {e['error']}" for name, e in router_report["errors"].items())
+        print(f"{router} ({router_report['ip']}) {router_report['elapsed']}s - {errors}")
+
+# sample cpu utilization of many routers on one event loop
+# every tick is scheduled from the start time and each router gets deadline seconds to answer
+# returns {router: [(elapsed, cpu)]} and {router: number of missed samples}
+async def monitor_cpu_async(router_ips, oid, duration=60, interval=10, deadline=None,
+                            max_in_flight=SNMP_ASYNC_MAX_IN_FLIGHT, timeout=3, retries=1,
+                            port=SNMP_PORT):
+    deadline = deadline or interval
+    client = AsyncSnmpClient(port=port, timeout=timeout, retries=retries, max_in_flight=max_in_flight)
+    loop = asyncio.get_running_loop()
+    samples = {router: [] for router in router_ips}
+    missed = {router: 0 for router in router_ips}
+
+    async def sample(router, ip, elapsed):
+        rows = {}
+        try:
+            await asyncio.wait_for(client.bulk_walk(ip, oid, rows), deadline)
+        except (asyncio.TimeoutError, TimeoutError, SnmpError, OSError):
+            pass
+        values = [value for value in rows.values() if value.isdigit()]
+        if values:
+            samples[router].append((elapsed, int(values[-1])))
+        else:
+            missed[router] += 1
+            print(f"time: {elapsed}s, no valid cpu data from {router}")
+
+    start = loop.time()
+    tick = 0
+    try:
+        while tick * interval < duration:
+            elapsed = round(tick * interval, 1)
+            await asyncio.gather(*(sample(router, ip, elapsed) for router, ip in router_ips.items()))
+            tick += 1
+            await asyncio.sleep(max(0, start + tick * interval - loop.time()))
+    finally:
+        client.close()
+    return samples, missed
+
+
+#MAIN
+if __name__ == "__main__":
+    router_ips = load_router_ips("snmp_routers.csv")
+    oids = load_oids("oid_commands.csv")
+
+    snmp_data, report = asyncio.run(fetch_snmp_data_async(router_ips, oids))
+    save_snmp_data(snmp_data)
+    display_snmp_data(snmp_data)
+    display_snmp_report(report)
@@ -0,0 +1,156 @@
+#/usr/bin/env python3
+import atexit
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from NMmetrics import METRICS
+
+# shared netmiko connections keyed by the credential dicts of load_router_info
+# a connection is used by one caller at a time, checked before it is handed out,
+# reopened when it died and closed after sitting idle
+
+# idle connections older than this are closed, at most this many are kept open
+SSH_IDLE_TIMEOUT = 300
+SSH_POOL_SIZE = 64
+
+
+#open a netmiko session, netmiko is imported on first use since it is slow to load
+def connect(credentials):
+    from netmiko import ConnectHandler
+    with METRICS.timer("ssh_connect_seconds"):
+        return InstrumentedConnection(ConnectHandler(**credentials))
+
+def connection_key(credentials):
+    return (credentials["device_type"], credentials["host"], credentials.get("port"),
+            credentials["username"], credentials["password"])
+
+
+class InstrumentedConnection:
+    """Netmiko connection proxy timing send_command and send_config_set, the rest is passed through."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def send_command(self, command_string, *args, **kwargs):
+        # label by the command without arguments so every show keeps a small label set
+        command = " ".join(str(command_string).split()[:3])
+        with METRICS.timer("ssh_command_seconds", op="send_command", command=command):
+            return self.conn.send_command(command_string, *args, **kwargs)
+
+    def send_config_set(self, *args, **kwargs):
+        with METRICS.timer("ssh_command_seconds", op="send_config_set"):
+            return self.conn.send_config_set(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+
+class _PooledConnection:
+    def __init__(self):
+        self.conn = None
+        self.last_used = time.monotonic()
+        self.users = 0  # callers holding or waiting for the connection, guarded by the pool lock
+        self.lock = threading.Lock()
+
+
+class SSHConnectionPool:
+    def __init__(self, idle_timeout=SSH_IDLE_TIMEOUT, max_size=SSH_POOL_SIZE):
+        self.idle_timeout = idle_timeout
+        self.max_size = max_size
+        self._entries = OrderedDict()  # connection key -> _PooledConnection, least recently used first
+        self._lock = threading.Lock()
+
+    def _entry(self, credentials):
+        key = connection_key(credentials)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _PooledConnection()
+            self._entries.move_to_end(key)
+            # marked in use before the pool lock is released, so evict cannot close it
+            # between here and the caller taking entry.lock
+            entry.users += 1
+            entry.last_used = time.monotonic()
+            return entry
+
+    def _release(self, entry):
+        with self._lock:
+            entry.users -= 1
+            entry.last_used = time.monotonic()
+
+    @staticmethod
+    def _close(entry):
+        if entry.conn is not None:
+            try:
+                entry.conn.disconnect()
+            except Exception:
+                pass
+            entry.conn = None
+
+    @staticmethod
+    def _alive(conn):
+        try:
+            return conn.is_alive()
+        except Exception:
+            return False
+
+    @contextmanager
+    def connection(self, credentials):
+        """Yield a live connection for credentials, opening or reopening it as needed.
+        The connection is dropped if the caller raises, so the next caller reconnects."""
+        entry = self._entry(credentials)
+        try:
+            with entry.lock:
+                if entry.conn is None or not self._alive(entry.conn):
+                    self._close(entry)
+                    entry.conn = connect(credentials)
+                try:
+                    yield entry.conn
+                except Exception:
+                    self._close(entry)
+                    raise
+        finally:
+            self._release(entry)
+        self.evict()
+
+    def evict(self):
+        """Close idle connections past idle_timeout and the least recently used ones over max_size."""
+        now = time.monotonic()
+        with self._lock:
+            over = len(self._entries) - self.max_size
+            for key, entry in list(self._entries.items()):
+                expired = now - entry.last_used > self.idle_timeout
+                if not (expired or over > 0):
+                    continue
+                # never close a connection somebody is using or waiting for
+                if entry.users or not entry.lock.acquire(blocking=False):
+                    continue
+                try:
+                    self._close(entry)
+                    del self._entries[key]
+                    over -= 1
+                finally:
+                    entry.lock.release()
+
+    def close(self, credentials):
+        with self._lock:
+            entry = self._entries.pop(connection_key(credentials), None)
+        if entry is not None:
+            with entry.lock:
+                self._close(entry)
+
+    def close_all(self):
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            with entry.lock:
+                self._close(entry)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+SSH_POOL = SSHConnectionPool()
+atexit.register(SSH_POOL.close_all)
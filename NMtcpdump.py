@@ -1,72 +1,335 @@
-from scapy.all import rdpcap, Ether, IPv6
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from ipaddress import IPv6Address
+import glob
 import json
+import mmap
+import os
+import re
+import struct
+import sys
+from NMmetrics import METRICS
+
+# scapy and numpy are imported inside the functions that need them,
+# the raw pcap readers and reverse_eui64 work without either
 
 PCAP_FILE = "c1_from_r2_r3.pcap"
 OUTPUT_FILE = "mac_addr.json"
+INVENTORY_FILE = "mac_inventory.json"
+
+# distinct addresses remembered by reverse_eui64
+EUI64_CACHE_SIZE = 4096
+IPV6_PREFIX = "2001:1111:2222:3333"
+
+LINKTYPE_ETHERNET = 1
+ETHERTYPE_IPV6 = b"\x86\xdd"
+ETHERTYPE_VLAN = (b"\x81\x00", b"\x88\xa8")
 
-def extract_mac_ipv6(pcap_file):
+# classic pcap magic -> (byte order, timestamp units per second)
+PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": ("<", 10 ** 6),
+    b"\xa1\xb2\xc3\xd4": (">", 10 ** 6),
+    b"\x4d\x3c\xb2\xa1": ("<", 10 ** 9),
+    b"\xa1\xb2\x3c\x4d": (">", 10 ** 9),
+}
+PCAPNG_SHB = b"\x0a\x0d\x0d\x0a"
+PCAPNG_BYTE_ORDER_LE = b"\x4d\x3c\x2b\x1a"
+
+def extract_mac_ipv6(pcap_file, stream=False):
     """Extracts IPv6 addresses starting with 2001:1111:2222:3333 and converts them to MAC addresses."""
-    packets = rdpcap(pcap_file)
+    if stream:
+        return extract_mac_ipv6_stream(pcap_file)
+
+    from scapy.all import rdpcap, Ether, IPv6
+
+    with METRICS.timer("pcap_read_seconds", method="rdpcap"):
+        packets = rdpcap(pcap_file)
+    METRICS.incr("pcap_packets_total", len(packets), method="rdpcap")
     mac_ipv6_mapping = {}
 
-    for pkt in packets:
-        if pkt.haslayer(Ether) and pkt.haslayer(IPv6):
-            src_ipv6 = pkt[IPv6].src
+    with METRICS.timer("pcap_process_seconds", method="rdpcap"):
+        for pkt in packets:
+            if pkt.haslayer(Ether) and pkt.haslayer(IPv6):
+                src_ipv6 = pkt[IPv6].src
 
-            # Process only IPv6 addresses starting with "2001:1111:2222:3333"
-            if src_ipv6.lower().startswith("2001:1111:2222:3333"):
-                mac_address = reverse_eui64(src_ipv6)
-                if mac_address:  # Store valid MACs
-                    mac_ipv6_mapping[src_ipv6] = mac_address
+                # Process only IPv6 addresses starting with "2001:1111:2222:3333"
+                if src_ipv6.lower().startswith(IPV6_PREFIX.lower()):
+                    mac_address = reverse_eui64(src_ipv6)
+                    if mac_address:  # Store valid MACs
+                        mac_ipv6_mapping[src_ipv6] = mac_address
 
     return mac_ipv6_mapping
 
-def reverse_eui64(ipv6):
-    """Converts an EUI-64-based IPv6 address back to its MAC address."""
-    parts = ipv6.split(":")
+def prefix_bytes(prefix):
+    """Packed leading bytes of an IPv6 prefix written as full groups, e.g. 2001:1111:2222:3333."""
+    return IPv6Address(f"{prefix}::").packed[:2 * len(prefix.split(":"))]
+
+def ipv6_source(frame, prefix):
+    """Returns the 16-byte IPv6 source of a raw Ethernet frame if it starts with prefix, else None."""
+    offset = 12
+    while frame[offset:offset + 2] in ETHERTYPE_VLAN:  # skip 802.1Q/802.1ad tags
+        offset += 4
+    if frame[offset:offset + 2] != ETHERTYPE_IPV6:
+        return None
+    src = frame[offset + 10:offset + 26]  # IPv6 source follows 8 bytes of IPv6 header
+    if len(src) != 16 or src[:len(prefix)] != prefix:
+        return None
+    return bytes(src)
+
+def extract_mac_ipv6_stream(pcap_file, prefix=IPV6_PREFIX):
+    """Streams pcap/pcapng records one at a time and filters on raw EtherType and source prefix
+    bytes, so only matching sources are decoded and memory stays flat on large captures."""
+    from scapy.all import RawPcapReader
+
+    prefix = prefix_bytes(prefix)
+    mac_ipv6_mapping = {}
+    seen = set()
+    packets = 0
+
+    with METRICS.timer("pcap_process_seconds", method="stream"), RawPcapReader(pcap_file) as reader:
+        for frame, metadata in reader:
+            packets += 1
+            # pcapng carries the link type per interface, classic pcap per file
+            linktype = metadata.linktype if hasattr(metadata, "linktype") else reader.linktype
+            if linktype != LINKTYPE_ETHERNET:
+                continue
+            src = ipv6_source(frame, prefix)
+            if src is None or src in seen:
+                continue
+            seen.add(src)
+
+            src_ipv6 = str(IPv6Address(src))
+            mac_address = reverse_eui64(src_ipv6)
+            if mac_address:  # Store valid MACs
+                mac_ipv6_mapping[src_ipv6] = mac_address
+
+    METRICS.incr("pcap_packets_total", packets, method="stream")
+    return mac_ipv6_mapping
+
+def iter_pcap_frames(buf):
+    """Yields (timestamp, linktype, frame) for each record of a classic pcap buffer.
+    Frames are memoryview slices of buf, nothing is copied."""
+    endian, units = PCAP_MAGIC[bytes(buf[:4])]
+    linktype = struct.unpack_from(endian + "I", buf, 20)[0]
+    record = struct.Struct(endian + "IIII")
+    view = memoryview(buf)
+    pos = 24
+    end = len(buf)
+    while pos + 16 <= end:
+        sec, frac, caplen, _ = record.unpack_from(buf, pos)
+        pos += 16
+        yield sec + frac / units, linktype, view[pos:pos + caplen]
+        pos += caplen
+
+def iter_pcapng_frames(buf):
+    """Yields (timestamp, linktype, frame) for each packet block of a pcapng buffer.
+    Simple packet blocks carry no timestamp and yield None."""
+    view = memoryview(buf)
+    endian = "<"
+    interfaces = []  # (linktype, timestamp units per second) per interface id
+    pos = 0
+    end = len(buf)
+    while pos + 12 <= end:
+        if buf[pos:pos + 4] == PCAPNG_SHB:
+            # a new section resets byte order and interfaces
+            endian = "<" if buf[pos + 8:pos + 12] == PCAPNG_BYTE_ORDER_LE else ">"
+            interfaces = []
+        block_type, block_len = struct.unpack_from(endian + "II", buf, pos)
+        if block_len < 12:
+            break
+
+        if block_type == 1:  # interface description block
+            linktype = struct.unpack_from(endian + "H", buf, pos + 8)[0]
+            units = 10 ** 6
+            opt = pos + 16
+            while opt + 4 <= pos + block_len - 4:
+                code, length = struct.unpack_from(endian + "HH", buf, opt)
+                if code == 0:
+                    break
+                if code == 9:  # if_tsresol, power of 10 unless the high bit selects power of 2
+                    value = buf[opt + 4]
+                    units = 2 ** (value & 0x7F) if value & 0x80 else 10 ** value
+                opt += 4 + (length + 3) // 4 * 4
+            interfaces.append((linktype, units))
+        elif block_type == 6:  # enhanced packet block
+            iface, ts_high, ts_low, caplen = struct.unpack_from(endian + "IIII", buf, pos + 8)
+            linktype, units = interfaces[iface]
+            sec, frac = divmod((ts_high << 32) | ts_low, units)  # same arithmetic as classic pcap
+            yield sec + frac / units, linktype, view[pos + 28:pos + 28 + caplen]
+        elif block_type == 3:  # simple packet block
+            wirelen = struct.unpack_from(endian + "I", buf, pos + 8)[0]
+            caplen = min(wirelen, block_len - 16)
+            yield None, interfaces[0][0], view[pos + 12:pos + 12 + caplen]
+        pos += block_len
+
+def iter_ipv6_sources(buf, prefix=IPV6_PREFIX):
+    """Yields (timestamp, 16-byte source) for every Ethernet IPv6 frame whose source starts with prefix."""
+    prefix = prefix_bytes(prefix)
+    frames = iter_pcapng_frames(buf) if buf[:4] == PCAPNG_SHB else iter_pcap_frames(buf)
+    for timestamp, linktype, frame in frames:
+        if linktype != LINKTYPE_ETHERNET:
+            continue
+        src = ipv6_source(frame, prefix)
+        if src is not None:
+            yield timestamp, src
 
-    # Ensure IPv6 address has at least 8 segments
-    while len(parts) < 8:
-        parts.append("0000")
+@METRICS.timed("pcap_process_seconds", method="mmap")
+def extract_mac_ipv6_fast(pcap_file, prefix=IPV6_PREFIX):
+    """Memory-maps the capture and reads IPv6 sources at fixed offsets of each record,
+    without creating any scapy packets. Returns the same {ipv6: mac} mapping as extract_mac_ipv6."""
+    mac_ipv6_mapping = {}
+    if os.path.getsize(pcap_file) == 0:
+        return mac_ipv6_mapping
+
+    with open(pcap_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        sources = iter_ipv6_sources(buf, prefix)
+        try:
+            seen = list(dict.fromkeys(src for _, src in sources))
+        finally:
+            sources.close()  # release the memoryview on the map before it is closed
+
+    for src, mac_address in zip(seen, reverse_eui64_batch(seen)):
+        if mac_address:  # Store valid MACs
+            mac_ipv6_mapping[str(IPv6Address(src))] = mac_address
+
+    return mac_ipv6_mapping
+
+def is_capture(path):
+    """True if the file starts with a pcap or pcapng magic number."""
+    try:
+        with open(path, "rb") as f:
+            magic = f.read(4)
+    except OSError:
+        return False
+    return magic in PCAP_MAGIC or magic == PCAPNG_SHB
+
+def capture_sort_key(path):
+    """Natural sort so rotated tcpdump -C/-W files (cap, cap1, cap2, ... cap10) stay in order."""
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", os.path.basename(path))]
+
+def expand_pcap_paths(sources):
+    """Resolves a file, directory, glob pattern or a list of those into capture files in rotation order."""
+    if isinstance(sources, str):
+        sources = [sources]
+    paths = []
+    for source in sources:
+        if os.path.isdir(source):
+            candidates = [os.path.join(source, name) for name in os.listdir(source)]
+        elif glob.has_magic(source):
+            candidates = glob.glob(source)
+        else:
+            candidates = [source]
+        paths.extend(sorted((p for p in candidates if os.path.isfile(p) and is_capture(p)), key=capture_sort_key))
+    return list(dict.fromkeys(paths))  # drop duplicates, keep order
+
+def scan_capture(pcap_file, prefix=IPV6_PREFIX):
+    """Worker for extract_mac_ipv6_files: {ipv6: {"mac", "first_seen", "last_seen"}} for one capture."""
+    inventory = {}
+    if os.path.getsize(pcap_file) == 0:
+        return inventory
+
+    with open(pcap_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        by_source = {}
+        sources = iter_ipv6_sources(buf, prefix)
+        try:
+            for timestamp, src in sources:
+                seen = by_source.get(src)
+                if seen is None:
+                    by_source[src] = [timestamp, timestamp]
+                elif timestamp is not None:
+                    if seen[0] is None or timestamp < seen[0]:
+                        seen[0] = timestamp
+                    if seen[1] is None or timestamp > seen[1]:
+                        seen[1] = timestamp
+        finally:
+            sources.close()
+
+    for (src, (first_seen, last_seen)), mac_address in zip(by_source.items(), reverse_eui64_batch(list(by_source))):
+        if mac_address:
+            inventory[str(IPv6Address(src))] = {"mac": mac_address, "first_seen": first_seen, "last_seen": last_seen}
+    return inventory
 
-    # Extract last 64 bits (EUI-64 interface identifier)
-    eui64_segments = parts[4:8]  # Extract segments after the first 4 (EUI-64 portion)
+def merge_inventories(file_inventories):
+    """Merges per-file inventories given in rotation order as [(file, inventory)].
+    Ties on a timestamp keep the earlier file for first_seen and the later file for last_seen,
+    so the result does not depend on which worker finished first."""
+    merged = {}
+    for pcap_file, inventory in file_inventories:
+        for ipv6, entry in inventory.items():
+            record = merged.get(ipv6)
+            if record is None:
+                merged[ipv6] = dict(entry, first_file=pcap_file, last_file=pcap_file)
+                continue
+            first_seen, last_seen = entry["first_seen"], entry["last_seen"]
+            if first_seen is not None and (record["first_seen"] is None or first_seen < record["first_seen"]):
+                record["first_seen"], record["first_file"] = first_seen, pcap_file
+            if last_seen is not None and (record["last_seen"] is None or last_seen >= record["last_seen"]):
+                record["last_seen"], record["last_file"] = last_seen, pcap_file
+    return merged
 
-    # Expand zero-compressed addresses
-    eui64_segments = [segment.zfill(4) for segment in eui64_segments]
+@METRICS.timed("pcap_process_seconds", method="files")
+def extract_mac_ipv6_files(sources, max_workers=None, prefix=IPV6_PREFIX):
+    """Scans many captures (files, directories, globs) across a process pool and merges them into
+    {ipv6: {"mac", "first_seen", "last_seen", "first_file", "last_file"}}."""
+    paths = expand_pcap_paths(sources)
+    if not paths:
+        return {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        inventories = list(executor.map(scan_capture, paths, [prefix] * len(paths)))
+    return merge_inventories(zip(paths, inventories))
 
-    # Ensure we have exactly 4 segments
-    if len(eui64_segments) != 4:
+def inventory_to_mapping(inventory):
+    """{ipv6: mac} view of an inventory, as consumed by save_mapping."""
+    return {ipv6: entry["mac"] for ipv6, entry in inventory.items()}
+
+def save_inventory(inventory, output_file=INVENTORY_FILE):
+    """saving merged inventory with first/last seen in json file"""
+    with open(output_file, "w") as f:
+        json.dump(inventory, f, indent=4)
+    print(f"MAC inventory saved to {output_file}")
+
+@lru_cache(maxsize=EUI64_CACHE_SIZE)
+def reverse_eui64(ipv6):
+    """Converts an EUI-64-based IPv6 address back to its MAC address."""
+    try:
+        iid = int(IPv6Address(ipv6)) & 0xFFFFFFFFFFFFFFFF  # last 64 bits, :: already expanded
+    except ValueError:
         print(f"Skipping invalid IPv6 address: {ipv6}")
         return None
 
-    # Join segments as a single string
-    eui64 = "".join(eui64_segments)
-
-    # Ensure 'FFFE' is in the correct place
-    if eui64[6:10].lower() != "fffe":
+    # EUI-64 puts FFFE between the two halves of the MAC
+    if (iid >> 24) & 0xFFFF != 0xFFFE:
         print(f"Skipping non-EUI-64 IPv6 address: {ipv6}")
         return None
 
-    # Extract MAC address components (remove FFFE)
-    mac = [
-        eui64[0:2], eui64[2:4],  # First byte
-        eui64[4:6], eui64[10:12],  # Middle bytes (excluding FFFE)
-        eui64[12:14], eui64[14:16]  # Last bytes
-    ]
+    # drop FFFE and flip the universal/local bit of the first octet
+    mac = ((iid >> 40) << 24 | (iid & 0xFFFFFF)) ^ (0x02 << 40)
+    return ":".join(f"{b:02X}" for b in mac.to_bytes(6, "big"))
 
-    # Ensure we have 6 elements to avoid IndexError
-    if len(mac) != 6:
-        print(f"Skipping malformed EUI-64 IPv6 address: {ipv6}")
-        return None
+def reverse_eui64_batch(addresses):
+    """Decodes many packed 16-byte IPv6 addresses in one vectorized pass.
+
+    addresses is a sequence of 16-byte strings, one bytes object holding them back to back,
+    or a (n, 16) uint8 array. Returns a list of MACs, None where the address is not EUI-64."""
+    import numpy as np
 
-    # Convert first octet and flip the 7th bit
-    first_octet = int(mac[0], 16)
-    first_octet ^= 0b00000010  # Flip the bit
+    if isinstance(addresses, np.ndarray):
+        raw = addresses.astype(np.uint8, copy=False).reshape(-1, 16)
+    else:
+        data = addresses if isinstance(addresses, (bytes, bytearray, memoryview)) else b"".join(addresses)
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 16)
+    if not len(raw):
+        return []
 
-    # Format MAC address
-    mac[0] = f"{first_octet:02X}"
-    return f"{mac[0]}:{mac[1]}:{mac[2]}:{mac[3]}:{mac[4]}:{mac[5]}"
+    valid = (raw[:, 11] == 0xFF) & (raw[:, 12] == 0xFE)
+    mac = np.concatenate([raw[:, 8:11], raw[:, 13:16]], axis=1)
+    mac[:, 0] ^= 0x02
+
+    digits = mac.tobytes().hex().upper()
+    return [
+        ":".join(digits[i * 12 + j:i * 12 + j + 2] for j in range(0, 12, 2)) if ok else None
+        for i, ok in enumerate(valid.tolist())
+    ]
 
 def save_mapping(data, output_file):
     """saving extracted MACs in json file """
@@ -76,7 +339,13 @@ def save_mapping(data, output_file):
     print(f"MAC addresses saved to {output_file}")
 
 if __name__ == "__main__":
-    mac_ipv6_map = extract_mac_ipv6(PCAP_FILE)
+    # optional arguments: capture files, directories or glob patterns
+    if len(sys.argv) > 1:
+        inventory = extract_mac_ipv6_files(sys.argv[1:])
+        save_inventory(inventory)
+        mac_ipv6_map = inventory_to_mapping(inventory)
+    else:
+        mac_ipv6_map = extract_mac_ipv6(PCAP_FILE, stream=True)
     save_mapping(mac_ipv6_map, OUTPUT_FILE)
 
     print("\nExtracted Mac from ipv6 address")
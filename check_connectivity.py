@@ -1,12 +1,21 @@
 #/usr/bin/env python3
 import csv
 import json
-from netmiko import ConnectHandler
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from NMsshpool import SSH_POOL, connect
+from NMiosparse import get_ipv6_neighbors
 
 # csv and json file paths
 ROUTERS_INFO_CSV = "routers_info.csv"
 MAC_JSON = "mac_addr.json"
 
+# reachability sweep defaults
+SWEEP_MAX_WORKERS = 64
+SWEEP_TCP_TIMEOUT = 3
+SSH_PORT = 22
+
 # load router credentials from csv
 def load_router_info(file_path):
     router_info = {}
@@ -37,8 +46,8 @@ def load_mac_addresses():
 # test ssh connection to a router
 def test_ssh_connection(credentials):
     try:
-        net_connect = ConnectHandler(**credentials)
-        net_connect.disconnect()
+        with SSH_POOL.connection(credentials):
+            pass  # the session stays open in the pool for the next step
         return True
     except Exception as e:
         print(f"ssh connection failed for {credentials['host']}: {str(e)}")
@@ -47,19 +56,14 @@ def test_ssh_connection(credentials):
 # get r5 global ipv6 address using r4's neighbor table
 def get_r5_ipv6_address(r4_creds, r5_host):
     try:
-        net_connect = ConnectHandler(**r4_creds)
-        output = net_connect.send_command("show ipv6 neighbors")
-        net_connect.disconnect()
+        neighbors = get_ipv6_neighbors(r4_creds)
     except Exception as e:
         print(f"failed to retrieve r5 mac address from r4: {str(e)}")
         return None
 
-    r5_mac = None
-    for line in output.split("\n"):
-        parts = line.split()
-        if len(parts) > 2 and r5_host in parts[0]:  # match r5 ipv6 address in neighbor table
-            r5_mac = parts[1].replace(".", "").lower()
-            break
+    # match r5 ipv6 address in neighbor table
+    neighbor = neighbors.first("ipv6", r5_host)
+    r5_mac = neighbor.mac.replace(".", "").lower() if neighbor else None
 
     if not r5_mac:
         print("error: could not determine r5 mac address from r4.")
@@ -69,6 +73,65 @@ def get_r5_ipv6_address(r4_creds, r5_host):
 
     return r5_host  # return r5 ipv6 address from csv
 
+# tcp connect probe, returns (latency in seconds or None, error or None)
+def tcp_probe(host, port=SSH_PORT, timeout=SWEEP_TCP_TIMEOUT):
+    start = time.perf_counter()
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return round(time.perf_counter() - start, 4), None
+    except OSError as e:
+        return None, str(e) or type(e).__name__
+
+# full ssh login, returns (latency in seconds or None, error or None)
+def ssh_probe(credentials):
+    start = time.perf_counter()
+    try:
+        net_connect = connect(credentials)
+        net_connect.disconnect()
+        return round(time.perf_counter() - start, 4), None
+    except Exception as e:
+        return None, str(e) or type(e).__name__
+
+# check one host: tcp connect to the ssh port first, ssh login only if the port answered
+# port overrides the port in credentials (22 when they have none), both tiers use the same one
+def check_host(credentials, port=None, tcp_timeout=SWEEP_TCP_TIMEOUT, login=True):
+    port = port or credentials.get("port", SSH_PORT)
+    result = {
+        "host": credentials["host"],
+        "reachable": False,
+        "tcp_latency": None,
+        "ssh_latency": None,
+        "stage": "tcp",
+        "error": None,
+    }
+    result["tcp_latency"], result["error"] = tcp_probe(credentials["host"], port, tcp_timeout)
+    if result["error"] or not login:
+        result["reachable"] = result["error"] is None
+        return result
+
+    result["stage"] = "ssh"
+    result["ssh_latency"], result["error"] = ssh_probe(dict(credentials, port=port))
+    result["reachable"] = result["error"] is None
+    return result
+
+# check every host in router_info concurrently, results keep the csv order
+def sweep_reachability(router_info, max_workers=SWEEP_MAX_WORKERS, port=None,
+                       tcp_timeout=SWEEP_TCP_TIMEOUT, login=True):
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda creds: check_host(creds, port, tcp_timeout, login),
+                                 router_info.values()))
+
+# print sweep results, failures last
+def display_sweep_results(results):
+    for result in sorted(results, key=lambda r: not r["reachable"]):
+        if result["reachable"]:
+            latency = result["ssh_latency"] if result["ssh_latency"] is not None else result["tcp_latency"]
+            print(f"host: {result['host']}, reachable ({result['stage']}), latency: {latency}s")
+        else:
+            print(f"host: {result['host']}, failed at {result['stage']}: {result['error']}")
+    reachable = sum(r["reachable"] for r in results)
+    print(f"\n{reachable}/{len(results)} hosts reachable")
+
 if __name__ == "__main__":
     print("loading router and mac address data...")
     router_info = load_router_info(ROUTERS_INFO_CSV)
@@ -90,6 +153,9 @@ if __name__ == "__main__":
     for mac in mac_addresses:
         print(f"mac address: {mac}")
 
+    print("\nsweeping ssh reachability of all routers...")
+    display_sweep_results(sweep_reachability(router_info))
+
     # get first R4 found in csv
     r4_host = next((ipv6 for ipv6 in router_info if "db8:1::2" in ipv6), None)
     if not r4_host: